@@ -1,35 +1,108 @@
-from flask import Flask, request, jsonify, render_template
+from flask import Flask, Response, request, jsonify, render_template
 from flask_cors import CORS
-import joblib
-import pandas as pd
 import numpy as np
+import csv
+import io
 import os
+import threading
+import time
 from datetime import datetime
+from compression import PrecomputedJSON
+from json_provider import FastJSONProvider
+from metrics import Registry, StageTimer, CONTENT_TYPE
+from profiler import is_admin_request, register_profiling
+from model_loader import ModelHolder, MODEL_WATCH_INTERVAL
+from prediction_cache import PredictionCache
+from shard_router import ShardRouter
+from streaming import iter_blocks, ndjson_response, wants_stream
+from sweep import parse_sweep, range_extremes, sweep_columns, sweep_payload, sweep_records
 
 app = Flask(__name__)
+app.json = FastJSONProvider(app)
 CORS(app)
 
-# Load the trained model and encoders
-try:
-    model = joblib.load('models/crop_yield_model.pkl')
-    area_encoder = joblib.load('models/area_encoder.pkl')
-    item_encoder = joblib.load('models/item_encoder.pkl')
-    
-    # Load unique areas and items
-    with open('models/unique_areas.txt', 'r') as f:
-        unique_areas = [line.strip() for line in f.readlines()]
+# Largest number of rows accepted by /api/predict/batch
+MAX_BATCH_SIZE = 10000
+
+# Accept type that asks /api/predict for only the prediction and confidence, like ?compact=1
+COMPACT_MIMETYPE = 'application/vnd.crop-yield.compact+json'
+
+# Insight messages; results carry indexes into this table and responses look the text up
+INSIGHTS = (
+    "⚠️ Low rainfall detected. Consider irrigation systems for optimal yield.",
+    "🌧️ High rainfall detected. Ensure proper drainage to prevent waterlogging.",
+    "✅ Rainfall levels are optimal for crop growth.",
+    "❄️ Low temperature may slow crop growth. Consider greenhouse farming.",
+    "🔥 High temperature detected. Ensure adequate irrigation and shade.",
+    "🌡️ Temperature is within optimal range for crop cultivation.",
+    "🌱 Low pesticide usage. Monitor for pest infestations.",
+    "⚠️ High pesticide usage. Consider integrated pest management.",
+    "🛡️ Pesticide levels are balanced for crop protection.",
+    "🎉 Excellent yield potential! Maintain current practices.",
+    "👍 Good yield expected. Minor optimizations could improve results.",
+    "📈 Yield can be improved. Consider soil testing and nutrient management."
+)
+
+# The model and encoders are loaded on first use so importing app.py stays fast
+model_holder = ModelHolder()
+
+# Cache of (prediction, confidence, insights) keyed on the normalized inputs
+prediction_cache = PredictionCache()
+
+# Optionally load the model in the background as soon as the app is imported
+if os.environ.get('WARM_UP_MODEL') == '1':
+    threading.Thread(target=model_holder.warm_up, daemon=True).start()
+
+# Reload retrained models from models/ without restarting when MODEL_WATCH_INTERVAL is set
+model_holder.watch(MODEL_WATCH_INTERVAL)
+
+# Request counters and latency histograms served at /metrics
+metrics = Registry()
+request_counter = metrics.counter('crop_yield_requests_total', 'HTTP requests by endpoint, method, status and model version',
+                                  ('endpoint', 'method', 'status', 'model_version'))
+request_latency = metrics.histogram('crop_yield_request_duration_seconds', 'Request latency by endpoint', ('endpoint',))
+stage_latency = metrics.histogram('crop_yield_predict_stage_seconds', 'Time spent in each stage of /api/predict', ('stage',))
+metrics.callback('crop_yield_prediction_cache_lookups_total', 'Prediction cache lookups by result',
+                 lambda: {('hit',): prediction_cache.hits, ('miss',): prediction_cache.misses},
+                 'counter', ('result',))
+metrics.callback('crop_yield_prediction_cache_entries', 'Entries in the prediction cache',
+                 lambda: prediction_cache.stats()['size'])
+metrics.callback('crop_yield_model_reloads_total', 'Successful model reloads', lambda: model_holder.reloads, 'counter')
+
+def get_bundle():
+    """Return the loaded model bundle, keeping the prediction cache in step with it"""
+    bundle = model_holder.get()
+    if bundle is not None:
+        # Cached predictions are only valid for the model they were computed from
+        prediction_cache.validate(bundle.version)
+    return bundle
+
+@app.before_request
+def start_request_timer():
+    """Note when the request started for the latency histogram"""
+    request.environ['crop_yield.request_start'] = time.perf_counter()
+
+@app.after_request
+def record_request_metrics(response):
+    """Count every response and record its latency"""
+    # Resolve the request proxy once; each proxied attribute access has a cost
+    req = request._get_current_object()
+    endpoint = req.url_rule.rule if req.url_rule else 'unmatched'
+    start = req.environ.get('crop_yield.request_start')
+    if start is not None:
+        request_latency.observe(time.perf_counter() - start, endpoint)
     
-    with open('models/unique_items.txt', 'r') as f:
-        unique_items = [line.strip() for line in f.readlines()]
-        
-    print("✅ Model and encoders loaded successfully!")
-except Exception as e:
-    print(f"❌ Error loading model: {e}")
-    model = None
-    area_encoder = None
-    item_encoder = None
-    unique_areas = []
-    unique_items = []
+    # current() never triggers a model load just to label a request
+    bundle = model_holder.current()
+    request_counter.inc(endpoint, req.method, str(response.status_code), bundle.version if bundle else 'none')
+    return response
+
+def model_unavailable():
+    """Error response used while no model is loaded"""
+    return jsonify({'error': f'Model not loaded: {model_holder.error}. Please run model_training.py first.'}), 503
+
+# Opt-in sampling profiles of /api/predict, listed and downloaded through the admin endpoints
+register_profiling(app, is_admin_request)
 
 @app.route('/')
 def index():
@@ -40,128 +113,382 @@ def index():
 def predict_yield():
     """Predict crop yield based on input parameters"""
     try:
-        data = request.get_json()
+        bundle = get_bundle()
+        if bundle is None:
+            return model_unavailable()
         
-        # Extract input parameters
-        area = data.get('area', '').lower()
-        item = data.get('item', '').lower()
-        year = int(data.get('year', 2024))
-        rainfall = float(data.get('rainfall', 1000))
-        pesticides = float(data.get('pesticides', 100))
-        temperature = float(data.get('temperature', 20))
-        
-        # Validate inputs
-        if area not in unique_areas:
-            return jsonify({'error': f'Area "{area}" not found. Available areas: {unique_areas[:10]}...'}), 400
-        
-        if item not in unique_items:
-            return jsonify({'error': f'Crop "{item}" not found. Available crops: {unique_items[:10]}...'}), 400
-        
-        if year < 1990 or year > 2030:
-            return jsonify({'error': 'Year must be between 1990 and 2030'}), 400
+        timer = StageTimer(stage_latency)
+        data = request.get_json()
         
-        if rainfall < 0 or rainfall > 5000:
-            return jsonify({'error': 'Rainfall must be between 0 and 5000 mm'}), 400
+        # Extract and validate input parameters
+        area, item, year, rainfall, pesticides, temperature = parse_input(data)
         
-        if pesticides < 0 or pesticides > 10000:
-            return jsonify({'error': 'Pesticides must be between 0 and 10000 tonnes'}), 400
+        error = validate_input(bundle, area, item, year, rainfall, pesticides, temperature)
+        timer.mark('parse_validate')
+        if error:
+            return jsonify({'error': error}), 400
         
-        if temperature < -50 or temperature > 50:
-            return jsonify({'error': 'Temperature must be between -50 and 50°C'}), 400
+        key = (area, item, year, rainfall, pesticides, temperature)
+        cached = prediction_cache.get(key)
+        timer.mark('cache')
+        if cached is None:
+            # Encode categorical variables
+            area_encoded = bundle.area_codes[area]
+            item_encoded = bundle.item_codes[item]
+            timer.mark('encode')
+            
+            # Answer exact hits from the precomputed grid, otherwise run the model
+            prediction = None
+            if bundle.grid is not None:
+                prediction = bundle.grid.lookup(area_encoded, item_encoded, year, rainfall, pesticides, temperature)
+            if prediction is None:
+                prediction = bundle.predict_one([area_encoded, item_encoded, year, rainfall, pesticides, temperature])
+            timer.mark('predict')
+            
+            # Calculate confidence score (simplified)
+            confidence = confidence_score(prediction)
+            
+            # Generate insights
+            insights = insight_ids(rainfall, pesticides, temperature, prediction)
+            timer.mark('insights')
+            
+            cached = (prediction, confidence, insights)
+            prediction_cache.put(key, cached, bundle.version)
         
-        # Encode categorical variables
-        area_encoded = area_encoder.transform([area])[0]
-        item_encoded = item_encoder.transform([item])[0]
+        # Machine clients can skip the input echo and insights with ?compact=1
+        if wants_compact():
+            response = jsonify(compact_payload(cached))
+        else:
+            response = jsonify(prediction_payload(area, item, year, rainfall, pesticides, temperature, cached))
+        timer.mark('serialize')
+        return response
         
-        # Create feature array
-        features = np.array([[area_encoded, item_encoded, year, rainfall, pesticides, temperature]])
+    except Exception as e:
+        return jsonify({'error': f'Prediction failed: {str(e)}'}), 500
+
+@app.route('/api/predict/batch', methods=['POST'])
+def predict_yield_batch():
+    """Predict crop yield for many input rows with a single model call"""
+    bundle = get_bundle()
+    if bundle is None:
+        return model_unavailable()
+    
+    # Streamed batches are read, predicted and written in blocks, so they have no size limit
+    if wants_stream():
+        try:
+            rows = read_batch_rows(stream=True)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        return ndjson_response(stream_batch(bundle, rows))
+    
+    try:
+        rows = read_batch_rows()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    if len(rows) > MAX_BATCH_SIZE:
+        return jsonify({'error': f'Batch size must not exceed {MAX_BATCH_SIZE} rows'}), 400
+    
+    try:
+        results = predict_rows(bundle, rows)
+        succeeded = sum('error' not in result for result in results)
         
-        # Make prediction
-        prediction = model.predict(features)[0]
+        return jsonify({
+            'results': results,
+            'total': len(rows),
+            'succeeded': succeeded,
+            'failed': len(rows) - succeeded
+        })
         
-        # Calculate confidence score (simplified)
-        confidence = min(95, max(60, 100 - abs(prediction - 50000) / 1000))
+    except Exception as e:
+        return jsonify({'error': f'Batch prediction failed: {str(e)}'}), 500
+
+def predict_rows(bundle, rows, offset=0):
+    """Batch results for a list of input rows, numbered from offset"""
+    # Validate every row, keeping per-row errors instead of failing the batch
+    results = [None] * len(rows)
+    valid_rows = []
+    inputs = []
+    for index, data in enumerate(rows):
+        try:
+            values = parse_input(data)
+            error = validate_input(bundle, *values)
+        except (ValueError, TypeError, AttributeError) as e:
+            error = f'Invalid input: {str(e)}'
         
-        # Generate insights
-        insights = generate_insights(area, item, year, rainfall, pesticides, temperature, prediction)
+        if error:
+            results[index] = {'index': offset + index, 'error': error}
+        else:
+            valid_rows.append(index)
+            inputs.append(values)
+    
+    if inputs:
+        # Encode all rows at once and make one vectorized prediction
+        areas, items, years, rainfalls, pesticides, temperatures = zip(*inputs)
+        features = np.column_stack([
+            [bundle.area_codes[area] for area in areas],
+            [bundle.item_codes[item] for item in items],
+            years, rainfalls, pesticides, temperatures
+        ])
+        predictions = bundle.predict(features)
         
-        return jsonify({
-            'prediction': round(prediction, 2),
-            'confidence': round(confidence, 1),
-            'insights': insights,
-            'input_data': {
-                'area': area.title(),
-                'item': item.title(),
-                'year': year,
-                'rainfall': rainfall,
-                'pesticides': pesticides,
-                'temperature': temperature
+        for index, prediction in zip(valid_rows, predictions):
+            results[index] = {
+                'index': offset + index,
+                'prediction': round(prediction, 2),
+                'confidence': round(confidence_score(prediction), 1)
             }
-        })
+    
+    return results
+
+def stream_batch(bundle, rows):
+    """NDJSON blocks of batch results, ending with a summary record"""
+    total = 0
+    succeeded = 0
+    for block in iter_blocks(rows):
+        results = predict_rows(bundle, block, total)
+        total += len(block)
+        succeeded += sum('error' not in result for result in results)
+        yield results
+    
+    yield [{'total': total, 'succeeded': succeeded, 'failed': total - succeeded}]
+
+@app.route('/api/predict/sweep', methods=['POST'])
+def predict_yield_sweep():
+    """Predict crop yield over one or two input ranges with a single model call"""
+    bundle = get_bundle()
+    if bundle is None:
+        return model_unavailable()
+    
+    try:
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict):
+            raise ValueError('Expected a JSON object with "base" inputs and "ranges"')
+        
+        # Base inputs default like /api/predict; the swept fields replace theirs
+        base = parse_input(data.get('base', data))
+        base = dict(zip(('area', 'item', 'year', 'rainfall', 'pesticides', 'temperature'), base))
+        axes = parse_sweep(data)
+    except (ValueError, TypeError, AttributeError) as e:
+        return jsonify({'error': f'Invalid input: {str(e)}'}), 400
+    
+    # The limits are per field, so checking the ends of each range covers the whole grid
+    for values in range_extremes(base, axes):
+        error = validate_input(bundle, **values)
+        if error:
+            return jsonify({'error': error}), 400
+    
+    if wants_stream():
+        return ndjson_response(sweep_records(base, axes, lambda columns: sweep_predictions(bundle, base, columns)))
+    
+    try:
+        # Build the grid once and predict every point in one vectorized pass
+        predictions = sweep_predictions(bundle, base, sweep_columns(base, axes))
+        return jsonify(sweep_payload(base, axes, predictions))
         
     except Exception as e:
-        return jsonify({'error': f'Prediction failed: {str(e)}'}), 500
+        return jsonify({'error': f'Sweep failed: {str(e)}'}), 500
+
+def sweep_predictions(bundle, base, columns):
+    """Predict flattened sweep columns with one vectorized model call"""
+    points = len(columns['year'])
+    features = np.column_stack([
+        np.full(points, bundle.area_codes[base['area']]),
+        np.full(points, bundle.item_codes[base['item']]),
+        columns['year'], columns['rainfall'], columns['pesticides'], columns['temperature']
+    ])
+    return bundle.predict(features)
+
+@app.route('/api/admin/reload', methods=['POST'])
+def reload_model():
+    """Load the artifacts in models/ and swap them in without dropping requests"""
+    if not is_admin_request():
+        return jsonify({'error': 'Forbidden'}), 403
+    
+    try:
+        bundle = model_holder.reload()
+    except Exception as e:
+        return jsonify({'error': f'Reload failed: {str(e)}'}), 500
+    
+    return jsonify({'model_version': bundle.version, 'reloads': model_holder.reloads})
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Request counters and latency histograms in the Prometheus text format"""
+    return Response(metrics.render(), content_type=CONTENT_TYPE)
 
 @app.route('/api/areas', methods=['GET'])
 def get_areas():
     """Get list of available areas"""
-    return jsonify({'areas': unique_areas})
+    return list_response('areas')
 
 @app.route('/api/crops', methods=['GET'])
 def get_crops():
     """Get list of available crops"""
-    return jsonify({'crops': unique_items})
+    return list_response('crops')
 
 @app.route('/api/stats', methods=['GET'])
 def get_stats():
     """Get basic statistics about the model"""
-    return jsonify({
-        'total_areas': len(unique_areas),
-        'total_crops': len(unique_items),
-        'model_loaded': model is not None,
-        'last_updated': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    })
+    response = jsonify(stats_payload(get_bundle()))
+    
+    # The cache counters change with every prediction, so the ETag is hashed per response and
+    # there is no Last-Modified: the artifact time alone would answer changed stats with 304
+    response.add_etag()
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
 
-def generate_insights(area, item, year, rainfall, pesticides, temperature, prediction):
-    """Generate insights based on the prediction"""
-    insights = []
+def list_response(name):
+    """/api/areas or /api/crops, encoded and compressed once per loaded bundle"""
+    bundle = get_bundle()
+    if bundle is None:
+        return jsonify({name: []})
     
+    body = bundle.responses.get(name)
+    if body is None:
+        values = bundle.unique_areas if name == 'areas' else bundle.unique_items
+        body = bundle.responses[name] = PrecomputedJSON({name: values}, bundle.modified_at)
+    return body.response()
+
+def stats_payload(bundle):
+    """Model, cache and data statistics reported by /api/stats"""
+    return {
+        'total_areas': len(bundle.unique_areas) if bundle else 0,
+        'total_crops': len(bundle.unique_items) if bundle else 0,
+        'model_loaded': bundle is not None,
+        'model_version': bundle.version if bundle else None,
+        'model_loaded_at': datetime.fromtimestamp(bundle.loaded_at).strftime('%Y-%m-%d %H:%M:%S') if bundle else None,
+        'model_reloads': model_holder.reloads,
+        'model_error': model_holder.error,
+        'prediction_cache': prediction_cache.stats(),
+        'model_shards': bundle.model.stats() if bundle and isinstance(bundle.model, ShardRouter) else None,
+        'prediction_grid': bundle.grid.stats() if bundle and bundle.grid else None,
+        'last_updated': datetime.fromtimestamp(bundle.modified_at).strftime('%Y-%m-%d %H:%M:%S')
+                        if bundle and bundle.modified_at else None
+    }
+
+def prediction_payload(area, item, year, rainfall, pesticides, temperature, result):
+    """Response body for a (prediction, confidence, insight IDs) result"""
+    prediction, confidence, insights = result
+    
+    return {
+        'prediction': round(prediction, 2),
+        'confidence': round(confidence, 1),
+        'insights': [INSIGHTS[insight] for insight in insights],
+        'input_data': {
+            'area': area.title(),
+            'item': item.title(),
+            'year': year,
+            'rainfall': rainfall,
+            'pesticides': pesticides,
+            'temperature': temperature
+        }
+    }
+
+def compact_payload(result):
+    """Compact response body with only the prediction and confidence"""
+    prediction, confidence, _ = result
+    return {'prediction': round(prediction, 2), 'confidence': round(confidence, 1)}
+
+def wants_compact():
+    """Whether the client asked for a compact response with ?compact=1 or the compact Accept type"""
+    return request.args.get('compact') == '1' or request.accept_mimetypes.best == COMPACT_MIMETYPE
+
+def parse_input(data):
+    """Extract prediction parameters from a request payload, applying the form defaults"""
+    area = data.get('area', '').lower()
+    item = data.get('item', '').lower()
+    year = int(data.get('year', 2024))
+    rainfall = float(data.get('rainfall', 1000))
+    pesticides = float(data.get('pesticides', 100))
+    temperature = float(data.get('temperature', 20))
+    
+    return area, item, year, rainfall, pesticides, temperature
+
+def validate_input(bundle, area, item, year, rainfall, pesticides, temperature):
+    """Return an error message for invalid parameters, or None if they are valid"""
+    if area not in bundle.area_codes:
+        return f'Area "{area}" not found. Available areas: {bundle.unique_areas[:10]}...'
+    
+    if item not in bundle.item_codes:
+        return f'Crop "{item}" not found. Available crops: {bundle.unique_items[:10]}...'
+    
+    if year < 1990 or year > 2030:
+        return 'Year must be between 1990 and 2030'
+    
+    if rainfall < 0 or rainfall > 5000:
+        return 'Rainfall must be between 0 and 5000 mm'
+    
+    if pesticides < 0 or pesticides > 10000:
+        return 'Pesticides must be between 0 and 10000 tonnes'
+    
+    if temperature < -50 or temperature > 50:
+        return 'Temperature must be between -50 and 50°C'
+    
+    return None
+
+def read_batch_rows(stream=False):
+    """Read batch input rows from a JSON array (or {"inputs": [...]}) or a CSV body"""
+    if request.mimetype == 'text/csv':
+        # When streaming, CSV rows are parsed from the body as they are predicted
+        if stream:
+            text = io.TextIOWrapper(request.stream, encoding='utf-8', newline='')
+        else:
+            text = io.StringIO(request.get_data(as_text=True))
+        reader = csv.DictReader(text)
+        # Empty CSV cells fall back to the same defaults as missing JSON fields
+        rows = ({key: value for key, value in row.items() if value not in (None, '')} for row in reader)
+        return rows if stream else list(rows)
+    
+    payload = request.get_json(silent=True)
+    if isinstance(payload, dict):
+        payload = payload.get('inputs')
+    if not isinstance(payload, list):
+        raise ValueError('Expected a JSON array of inputs, an object with an "inputs" array, or a text/csv body')
+    return payload
+
+def confidence_score(prediction):
+    """Calculate a simplified confidence score for a prediction"""
+    return min(95, max(60, 100 - abs(prediction - 50000) / 1000))
+
+def insight_ids(rainfall, pesticides, temperature, prediction):
+    """Indexes into INSIGHTS of the insights for a prediction"""
     # Rainfall insights
     if rainfall < 500:
-        insights.append("⚠️ Low rainfall detected. Consider irrigation systems for optimal yield.")
+        rainfall_insight = 0
     elif rainfall > 2000:
-        insights.append("🌧️ High rainfall detected. Ensure proper drainage to prevent waterlogging.")
+        rainfall_insight = 1
     else:
-        insights.append("✅ Rainfall levels are optimal for crop growth.")
+        rainfall_insight = 2
     
     # Temperature insights
     if temperature < 10:
-        insights.append("❄️ Low temperature may slow crop growth. Consider greenhouse farming.")
+        temperature_insight = 3
     elif temperature > 35:
-        insights.append("🔥 High temperature detected. Ensure adequate irrigation and shade.")
+        temperature_insight = 4
     else:
-        insights.append("🌡️ Temperature is within optimal range for crop cultivation.")
+        temperature_insight = 5
     
     # Pesticides insights
     if pesticides < 50:
-        insights.append("🌱 Low pesticide usage. Monitor for pest infestations.")
+        pesticides_insight = 6
     elif pesticides > 1000:
-        insights.append("⚠️ High pesticide usage. Consider integrated pest management.")
+        pesticides_insight = 7
     else:
-        insights.append("🛡️ Pesticide levels are balanced for crop protection.")
+        pesticides_insight = 8
     
     # Yield prediction insights
     if prediction > 100000:
-        insights.append("🎉 Excellent yield potential! Maintain current practices.")
+        yield_insight = 9
     elif prediction > 50000:
-        insights.append("👍 Good yield expected. Minor optimizations could improve results.")
+        yield_insight = 10
     else:
-        insights.append("📈 Yield can be improved. Consider soil testing and nutrient management.")
+        yield_insight = 11
     
-    return insights
+    return (rainfall_insight, temperature_insight, pesticides_insight, yield_insight)
 
 if __name__ == '__main__':
-    if model is None:
+    if model_holder.warm_up() is None:
         print("❌ Model not loaded. Please run model_training.py first.")
     else:
         print("🚀 Starting Crop Yield Prediction API...")
@@ -0,0 +1,281 @@
+import asyncio
+import json
+import os
+from urllib.parse import parse_qs
+import numpy as np
+from werkzeug.datastructures import MIMEAccept
+from werkzeug.http import generate_etag, parse_accept_header, parse_date, parse_etags
+from app import (model_holder, prediction_cache, get_bundle, parse_input, validate_input, confidence_score,
+                 insight_ids, compact_payload, prediction_payload, stats_payload, COMPACT_MIMETYPE)
+from compression import PrecomputedJSON
+from json_provider import dumps
+
+# How long the first queued prediction waits for others to join its batch, and the batch size cap
+BATCH_WAIT_MS = float(os.environ.get('BATCH_WAIT_MS', 2))
+BATCH_MAX_SIZE = int(os.environ.get('BATCH_MAX_SIZE', 256))
+
+# Largest request body accepted, in bytes
+MAX_BODY_SIZE = 1 << 20
+
+class MicroBatcher:
+    """Collects concurrent single-row predictions and runs them as one vectorized model call"""
+    
+    def __init__(self, max_wait=BATCH_WAIT_MS / 1000, max_size=BATCH_MAX_SIZE):
+        self.max_wait = max_wait
+        self.max_size = max_size
+        self._pending = []
+        self._timer = None
+        self._tasks = set()
+        self.batches = 0
+        self.rows = 0
+        self.largest = 0
+    
+    def submit(self, bundle, features):
+        """Queue one feature row and return a future for its prediction"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((bundle, features, future))
+        
+        if len(self._pending) >= self.max_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+        return future
+    
+    def _flush(self):
+        """Start predicting everything queued so far"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        
+        pending, self._pending = self._pending, []
+        if pending:
+            task = asyncio.ensure_future(self._run(pending))
+            # Keep a reference so the task is not garbage collected while running
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+    
+    async def _run(self, pending):
+        """Predict a batch in a worker thread and hand each caller its result"""
+        loop = asyncio.get_running_loop()
+        
+        # A model reload can land mid-batch; each row is predicted by the bundle it was validated against
+        groups = {}
+        for bundle, features, future in pending:
+            groups.setdefault(id(bundle), (bundle, []))[1].append((features, future))
+        
+        for bundle, rows in groups.values():
+            features = np.array([features for features, future in rows], dtype=np.float64)
+            try:
+                predictions = await loop.run_in_executor(None, bundle.predict, features)
+            except Exception as e:
+                for features, future in rows:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            
+            self.batches += 1
+            self.rows += len(rows)
+            self.largest = max(self.largest, len(rows))
+            for (features, future), prediction in zip(rows, predictions):
+                # The caller may have disconnected and cancelled its future
+                if not future.done():
+                    future.set_result(float(prediction))
+    
+    def stats(self):
+        """Return batch counters for /api/stats"""
+        return {
+            'max_wait_ms': self.max_wait * 1000,
+            'max_size': self.max_size,
+            'batches': self.batches,
+            'rows': self.rows,
+            'average_batch': round(self.rows / self.batches, 2) if self.batches else 0.0,
+            'largest_batch': self.largest
+        }
+
+batcher = MicroBatcher()
+
+def request_header(scope, name):
+    """Value of a request header by lowercase name, or None"""
+    name = name.encode('latin-1')
+    for key, value in scope['headers']:
+        if key == name:
+            return value.decode('latin-1')
+    return None
+
+def query_arg(scope, name):
+    """First value of a query string argument, or None"""
+    values = parse_qs(scope.get('query_string', b'').decode('latin-1')).get(name)
+    return values[0] if values else None
+
+def wants_compact(scope):
+    """Whether the client asked for a compact response with ?compact=1 or the compact Accept type"""
+    if query_arg(scope, 'compact') == '1':
+        return True
+    return parse_accept_header(request_header(scope, 'accept'), MIMEAccept).best == COMPACT_MIMETYPE
+
+def json_response(status, payload):
+    """(status, headers, body) of a JSON response"""
+    return status, [('Content-Type', 'application/json')], dumps(payload)
+
+async def predict(scope, body):
+    """Same contract as app.py's /api/predict, with the model call batched"""
+    try:
+        bundle = get_bundle()
+        if bundle is None:
+            return json_response(503, {'error': f'Model not loaded: {model_holder.error}. Please run model_training.py first.'})
+        
+        data = json.loads(body)
+        
+        # Extract and validate input parameters
+        area, item, year, rainfall, pesticides, temperature = parse_input(data)
+        
+        error = validate_input(bundle, area, item, year, rainfall, pesticides, temperature)
+        if error:
+            return json_response(400, {'error': error})
+        
+        key = (area, item, year, rainfall, pesticides, temperature)
+        cached = prediction_cache.get(key)
+        if cached is None:
+            features = [bundle.area_codes[area], bundle.item_codes[item], year, rainfall, pesticides, temperature]
+            
+            # Grid hits are answered directly; everything else joins the next batch
+            prediction = None
+            if bundle.grid is not None:
+                prediction = bundle.grid.lookup(*features)
+            if prediction is None:
+                prediction = await batcher.submit(bundle, features)
+            
+            insights = insight_ids(rainfall, pesticides, temperature, prediction)
+            cached = (prediction, confidence_score(prediction), insights)
+            prediction_cache.put(key, cached, bundle.version)
+        
+        # Machine clients can skip the input echo and insights with ?compact=1
+        if wants_compact(scope):
+            return json_response(200, compact_payload(cached))
+        return json_response(200, prediction_payload(area, item, year, rainfall, pesticides, temperature, cached))
+    
+    except Exception as e:
+        return json_response(500, {'error': f'Prediction failed: {str(e)}'})
+
+def get_areas(scope):
+    """Get list of available areas"""
+    return list_response(scope, 'areas')
+
+def get_crops(scope):
+    """Get list of available crops"""
+    return list_response(scope, 'crops')
+
+def get_stats(scope):
+    """Get basic statistics about the model and the micro-batcher"""
+    stats = stats_payload(get_bundle())
+    stats['micro_batcher'] = batcher.stats()
+    
+    # Hashed per response like app.py's /api/stats, so only unchanged stats get a 304
+    body = dumps(stats)
+    etag = generate_etag(body)
+    headers = [('Content-Type', 'application/json'), ('ETag', f'"{etag}"'), ('Cache-Control', 'no-cache')]
+    if parse_etags(request_header(scope, 'if-none-match')).contains_weak(etag):
+        return 304, headers, b''
+    return 200, headers, body
+
+def list_response(scope, name):
+    """/api/areas or /api/crops from the same precomputed bodies as app.py"""
+    bundle = get_bundle()
+    if bundle is None:
+        return json_response(200, {name: []})
+    
+    body = bundle.responses.get(name)
+    if body is None:
+        values = bundle.unique_areas if name == 'areas' else bundle.unique_items
+        body = bundle.responses[name] = PrecomputedJSON({name: values}, bundle.modified_at)
+    
+    # If-None-Match takes precedence over If-Modified-Since only when it is sent
+    if_none_match = request_header(scope, 'if-none-match')
+    return body.select(parse_accept_header(request_header(scope, 'accept-encoding')),
+                       None if if_none_match is None else parse_etags(if_none_match),
+                       parse_date(request_header(scope, 'if-modified-since')))
+
+# (method, path) -> handler; handlers take the scope, POST handlers also the request body,
+# and return (status, headers, body)
+ROUTES = {
+    ('POST', '/api/predict'): predict,
+    ('GET', '/api/areas'): get_areas,
+    ('GET', '/api/crops'): get_crops,
+    ('GET', '/api/stats'): get_stats
+}
+
+async def read_body(receive):
+    """Read the full request body, or None if it is larger than MAX_BODY_SIZE"""
+    body = b''
+    while True:
+        message = await receive()
+        body += message.get('body', b'')
+        if len(body) > MAX_BODY_SIZE:
+            return None
+        if not message.get('more_body'):
+            return body
+
+async def send_response(send, status, headers, body):
+    """Send a response with the same CORS header as the Flask app"""
+    raw_headers = [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers]
+    raw_headers.append((b'access-control-allow-origin', b'*'))
+    # A 304 has no body; its headers describe the representation the client already has
+    if status != 304:
+        raw_headers.append((b'content-length', str(len(body)).encode('ascii')))
+    await send({'type': 'http.response.start', 'status': status, 'headers': raw_headers})
+    await send({'type': 'http.response.body', 'body': body})
+
+async def send_json(send, status, payload):
+    """Send a JSON response with the same encoding as the Flask app"""
+    await send_response(send, *json_response(status, payload))
+
+async def lifespan(receive, send):
+    """Load the model before accepting requests"""
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await asyncio.get_running_loop().run_in_executor(None, model_holder.warm_up)
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+async def app(scope, receive, send):
+    """ASGI application"""
+    if scope['type'] == 'lifespan':
+        return await lifespan(receive, send)
+    if scope['type'] != 'http':
+        return
+    
+    method, path = scope['method'], scope['path']
+    if method == 'OPTIONS':
+        # CORS preflight, matching flask_cors defaults
+        await send({
+            'type': 'http.response.start',
+            'status': 200,
+            'headers': [
+                (b'access-control-allow-origin', b'*'),
+                (b'access-control-allow-methods', b'GET, POST, OPTIONS'),
+                (b'access-control-allow-headers', b'content-type'),
+                (b'content-length', b'0')
+            ]
+        })
+        await send({'type': 'http.response.body', 'body': b''})
+        return
+    
+    handler = ROUTES.get((method, path))
+    if handler is None:
+        allowed = any(route_path == path for route_method, route_path in ROUTES)
+        await send_json(send, 405 if allowed else 404, {'error': 'Method not allowed' if allowed else 'Not found'})
+        return
+    
+    if method == 'POST':
+        body = await read_body(receive)
+        if body is None:
+            await send_json(send, 413, {'error': 'Request body too large'})
+            return
+        response = await handler(scope, body)
+    else:
+        response = handler(scope)
+    await send_response(send, *response)
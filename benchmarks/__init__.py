@@ -0,0 +1 @@
+"""Performance benchmarks for the crop yield prediction servers"""
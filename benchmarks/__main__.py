@@ -0,0 +1,128 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+from datetime import datetime
+from benchmarks.load import run_load
+from benchmarks.micro import run_micro
+from benchmarks.startup import measure_startup
+
+RESULTS_DIR = 'benchmarks/results'
+
+# Metrics where a higher value is better; every other metric is a time or size
+HIGHER_IS_BETTER = ('requests_per_second',)
+
+def git_commit():
+    """Current commit id, marked dirty when the tree has uncommitted changes"""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'],
+                                capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'],
+                               capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+    return f'{commit}-dirty' if dirty else commit
+
+def run(args):
+    """Run the benchmarks and save the results as JSON"""
+    apps = ['app', 'simple_app'] if args.app == 'all' else [args.app]
+    results = {
+        'commit': git_commit(),
+        'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'micro': run_micro(apps, args.repeat),
+        'load': {name: run_load(name, args.requests, args.concurrency) for name in apps}
+    }
+    if args.startup:
+        results['startup'] = measure_startup(runs=3)
+    
+    print_results(results)
+    
+    output = args.output or os.path.join(RESULTS_DIR, f"{results['commit']}.json")
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"\n✅ Results saved to {output}")
+
+def print_results(results):
+    """Print a summary table of microbenchmark and load results"""
+    for app_name, benchmarks in results['micro'].items():
+        print(f"\n{app_name} microbenchmarks{'':<16}{'p50 µs':>10}{'p95 µs':>10}")
+        for name, stats in benchmarks.items():
+            print(f"  {name:<40}{stats['p50_us']:>10.2f}{stats['p95_us']:>10.2f}")
+    
+    for app_name, scenarios in results['load'].items():
+        print(f"\n{app_name} load{'':<10}{'req/s':>10}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'peak KB/req':>13}")
+        for name, stats in scenarios.items():
+            print(f"  {name:<20}{stats['requests_per_second']:>10.0f}{stats['p50_ms']:>9.3f}{stats['p95_ms']:>9.3f}"
+                  f"{stats['p99_ms']:>9.3f}{stats['peak_alloc_bytes_per_request'] / 1024:>13.1f}")
+
+def flatten(results, prefix=''):
+    """Numeric metrics of a results file keyed by their dotted path"""
+    metrics = {}
+    for key, value in results.items():
+        path = f'{prefix}{key}'
+        if isinstance(value, dict):
+            metrics.update(flatten(value, f'{path}.'))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            metrics[path] = value
+    return metrics
+
+def compare(args):
+    """Compare two results files and flag metrics that got worse by more than the threshold"""
+    with open(args.baseline, 'r') as f:
+        baseline = json.load(f)
+    with open(args.current, 'r') as f:
+        current = json.load(f)
+    
+    print(f"Comparing {baseline.get('commit')} -> {current.get('commit')}")
+    old, new = flatten(baseline), flatten(current)
+    regressions = 0
+    for path in sorted(old.keys() & new.keys()):
+        # Only compare the summary statistics, not counts or settings
+        if not path.endswith(('_us', '_ms', '_seconds', '_per_second', '_per_request')) or not old[path]:
+            continue
+        change = (new[path] - old[path]) / old[path] * 100
+        worse = -change if path.endswith(HIGHER_IS_BETTER) else change
+        flag = ''
+        if worse > args.threshold:
+            flag = '  ❌ regression'
+            regressions += 1
+        elif worse < -args.threshold:
+            flag = '  ✅ improvement'
+        print(f"{path:<60}{old[path]:>14.3f}{new[path]:>14.3f}{change:>+9.1f}%{flag}")
+    
+    print(f"\n{regressions} regressions above {args.threshold}%")
+    return 1 if regressions else 0
+
+def main():
+    """Run or compare the benchmark suite"""
+    parser = argparse.ArgumentParser(prog='python -m benchmarks',
+                                     description='Latency and throughput benchmarks for app.py and simple_app.py')
+    commands = parser.add_subparsers(dest='command', required=True)
+    
+    run_parser = commands.add_parser('run', help='run the benchmarks and save JSON results')
+    run_parser.add_argument('--app', choices=['app', 'simple_app', 'all'], default='all')
+    run_parser.add_argument('--repeat', type=int, default=2000, help='calls per microbenchmark')
+    run_parser.add_argument('--requests', type=int, default=2000, help='requests per load scenario')
+    run_parser.add_argument('--concurrency', type=int, default=1, help='client threads for the load test')
+    run_parser.add_argument('--startup', action='store_true', help='also measure app.py cold start')
+    run_parser.add_argument('--output', help=f'results file (default {RESULTS_DIR}/<commit>.json)')
+    
+    compare_parser = commands.add_parser('compare', help='compare two results files')
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current')
+    compare_parser.add_argument('--threshold', type=float, default=10.0,
+                                help='percent change counted as a regression')
+    
+    args = parser.parse_args()
+    if args.command == 'run':
+        run(args)
+    else:
+        sys.exit(compare(args))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+import random
+import threading
+import time
+import tracemalloc
+
+def percentile(samples, fraction):
+    """Value at the given fraction of sorted samples"""
+    return samples[min(len(samples) - 1, int(len(samples) * fraction))]
+
+def request_bodies(areas, items, count, seed=42):
+    """Random /api/predict payloads over the known areas and crops"""
+    rng = random.Random(seed)
+    return [{
+        'area': rng.choice(areas),
+        'item': rng.choice(items),
+        'year': rng.randint(1990, 2030),
+        'rainfall': round(rng.uniform(100, 3000), 1),
+        'pesticides': round(rng.uniform(0, 2000), 1),
+        'temperature': round(rng.uniform(0, 35), 1),
+        'seed': index
+    } for index in range(count)]
+
+def send(client, scenario, body):
+    """Send one request for a scenario and return its status code"""
+    if scenario == 'predict':
+        return client.post('/api/predict', json=body).status_code
+    return client.get(f'/api/{scenario}').status_code
+
+def run_scenario(flask_app, scenario, bodies, concurrency=1):
+    """Send every body through Flask's test client and time each request"""
+    latencies = []
+    statuses = {}
+    lock = threading.Lock()
+    
+    def worker(chunk):
+        client = flask_app.test_client()
+        local = []
+        for body in chunk:
+            start = time.perf_counter_ns()
+            status = send(client, scenario, body)
+            local.append(time.perf_counter_ns() - start)
+            with lock:
+                statuses[status] = statuses.get(status, 0) + 1
+        with lock:
+            latencies.extend(local)
+    
+    chunks = [bodies[index::concurrency] for index in range(concurrency)]
+    threads = [threading.Thread(target=worker, args=(chunk,)) for chunk in chunks]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'concurrency': concurrency,
+        'requests_per_second': len(latencies) / elapsed,
+        'p50_ms': percentile(latencies, 0.50) / 1e6,
+        'p95_ms': percentile(latencies, 0.95) / 1e6,
+        'p99_ms': percentile(latencies, 0.99) / 1e6,
+        'max_ms': latencies[-1] / 1e6,
+        'statuses': {str(status): count for status, count in sorted(statuses.items())}
+    }
+
+def measure_allocations(flask_app, scenario, bodies):
+    """Peak and retained traced memory per request, measured with tracemalloc"""
+    client = flask_app.test_client()
+    send(client, scenario, bodies[0])
+    
+    # tracemalloc slows requests down, so this runs separately from the timed pass
+    peaks = []
+    retained = []
+    tracemalloc.start()
+    try:
+        for body in bodies:
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            send(client, scenario, body)
+            current, peak = tracemalloc.get_traced_memory()
+            peaks.append(peak - before)
+            retained.append(current - before)
+    finally:
+        tracemalloc.stop()
+    
+    return {
+        'peak_alloc_bytes_per_request': sum(peaks) / len(peaks),
+        'retained_bytes_per_request': sum(retained) / len(retained)
+    }
+
+def run_load(app_name, requests=2000, concurrency=1, allocation_requests=100):
+    """Load-test one server in-process and return results per scenario"""
+    if app_name == 'app':
+        import app as module
+        bundle = module.get_bundle()
+        if bundle is None:
+            raise RuntimeError('Model not loaded; run model_training.py first')
+        areas, items = bundle.unique_areas, bundle.unique_items
+    else:
+        import simple_app as module
+        if not module.yield_data:
+            module.load_data()
+        areas, items = module.unique_areas, module.unique_items
+    
+    bodies = request_bodies(areas, items, requests)
+    results = {}
+    for scenario in ('predict', 'areas', 'stats'):
+        # Warm caches that are not under test (first request, template and JSON setup)
+        send(module.app.test_client(), scenario, bodies[0])
+        result = run_scenario(module.app, scenario, bodies, concurrency)
+        result.update(measure_allocations(module.app, scenario, bodies[:allocation_requests]))
+        results[scenario] = result
+    return results
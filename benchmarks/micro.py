@@ -0,0 +1,93 @@
+import json
+import random
+import statistics
+import time
+
+# Inputs shared by the microbenchmarks: a known (area, item) pair with the form defaults
+AREA = 'india'
+ITEM = 'wheat'
+YEAR = 2010
+
+def time_calls(func, repeat=2000, warmup=50):
+    """Time repeated calls of func and return per-call statistics in microseconds"""
+    for _ in range(warmup):
+        func()
+    
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter_ns()
+        func()
+        samples.append(time.perf_counter_ns() - start)
+    samples.sort()
+    
+    return {
+        'calls': repeat,
+        'mean_us': statistics.fmean(samples) / 1000,
+        'p50_us': samples[len(samples) // 2] / 1000,
+        'p95_us': samples[int(len(samples) * 0.95)] / 1000,
+        'min_us': samples[0] / 1000
+    }
+
+def app_benchmarks(repeat=2000):
+    """Microbenchmarks for the stages of app.py's predict_yield"""
+    import app
+    
+    bundle = app.get_bundle()
+    if bundle is None:
+        raise RuntimeError('Model not loaded; run model_training.py first')
+    
+    features = [bundle.area_codes[AREA], bundle.item_codes[ITEM], YEAR, 1000.0, 100.0, 20.0]
+    prediction = bundle.predict_one(features)
+    insights = app.insight_ids(1000.0, 100.0, 20.0, prediction)
+    payload = app.prediction_payload(AREA, ITEM, YEAR, 1000.0, 100.0, 20.0,
+                                     (prediction, app.confidence_score(prediction), insights))
+    
+    # Random climates so every call walks the tree instead of repeating one path
+    rng = random.Random(42)
+    rows = [features[:3] + [rng.uniform(0, 3000), rng.uniform(0, 1000), rng.uniform(0, 35)] for _ in range(256)]
+    row_iter = iter(rows * (repeat // len(rows) + 2))
+    
+    benchmarks = {
+        'parse_validate': lambda: app.validate_input(bundle, *app.parse_input(
+            {'area': AREA, 'item': ITEM, 'year': YEAR})),
+        'encode': lambda: (bundle.area_codes[AREA], bundle.item_codes[ITEM]),
+        'predict_one': lambda: bundle.predict_one(next(row_iter)),
+        'insights': lambda: app.insight_ids(1000.0, 100.0, 20.0, prediction),
+        'serialize': lambda: json.dumps(payload)
+    }
+    if bundle.grid is not None:
+        benchmarks['grid_lookup'] = lambda: bundle.grid.lookup(*features)
+    
+    with app.app.app_context():
+        benchmarks['jsonify'] = lambda: app.jsonify(payload)
+        return {name: time_calls(func, repeat) for name, func in benchmarks.items()}
+
+def simple_app_benchmarks(repeat=2000):
+    """Microbenchmarks for the stages of simple_app.py's predict_yield"""
+    import simple_app
+    
+    if not simple_app.yield_data:
+        simple_app.load_data()
+    
+    prediction = simple_app.similarity_weighted_yield(AREA, ITEM, YEAR, 1000.0, 100.0, 20.0)
+    payload = {'prediction': round(prediction, 2), 'confidence': 80.0,
+               'insights': simple_app.generate_insights(AREA, ITEM, YEAR, 1000.0, 100.0, 20.0, prediction)}
+    
+    # Vary the year so the uncached path is measured
+    years = iter([1990 + index % 40 for index in range(repeat + 100)])
+    
+    benchmarks = {
+        'similarity_weighted_yield': lambda: simple_app.similarity_weighted_yield(
+            AREA, ITEM, next(years), 1000.0, 100.0, 20.0),
+        'predict_yield_simple_cached': lambda: simple_app.predict_yield_simple(
+            AREA, ITEM, YEAR, 1000.0, 100.0, 20.0, seed=1),
+        'jitter_factor': lambda: simple_app.jitter_factor((AREA, ITEM, YEAR, 1000.0, 100.0, 20.0), 1),
+        'insights': lambda: simple_app.generate_insights(AREA, ITEM, YEAR, 1000.0, 100.0, 20.0, prediction),
+        'serialize': lambda: json.dumps(payload)
+    }
+    return {name: time_calls(func, repeat) for name, func in benchmarks.items()}
+
+def run_micro(apps=('app', 'simple_app'), repeat=2000):
+    """Run the microbenchmarks for the given servers"""
+    suites = {'app': app_benchmarks, 'simple_app': simple_app_benchmarks}
+    return {name: suites[name](repeat) for name in apps}
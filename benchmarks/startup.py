@@ -0,0 +1,58 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+# Runs in a fresh interpreter so imports and model loading are measured cold
+CHILD_SCRIPT = '''
+import json, time
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+response = app.app.test_client().post('/api/predict', json={'area': 'india', 'item': 'wheat', 'year': 2010})
+first = time.perf_counter()
+print(json.dumps({
+    'import_seconds': imported - start,
+    'first_prediction_seconds': first - start,
+    'status': response.status_code
+}))
+'''
+
+def measure_startup(runs=5, warm_up=False):
+    """Time importing app.py and serving its first prediction over several cold starts"""
+    env = dict(os.environ)
+    if warm_up:
+        env['WARM_UP_MODEL'] = '1'
+    
+    samples = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, '-c', CHILD_SCRIPT],
+            capture_output=True, text=True, check=True, env=env
+        ).stdout
+        samples.append(json.loads(output.strip().splitlines()[-1]))
+    
+    return {
+        'runs': runs,
+        'warm_up': warm_up,
+        'import_seconds': statistics.median(sample['import_seconds'] for sample in samples),
+        'first_prediction_seconds': statistics.median(sample['first_prediction_seconds'] for sample in samples),
+        'statuses': sorted({sample['status'] for sample in samples})
+    }
+
+def main():
+    """Report median cold-start timings for app.py"""
+    parser = argparse.ArgumentParser(description='Measure app.py cold start time')
+    parser.add_argument('--runs', type=int, default=5, help='number of cold starts to measure')
+    parser.add_argument('--warm-up', action='store_true', help='set WARM_UP_MODEL=1 for the child processes')
+    args = parser.parse_args()
+    
+    result = measure_startup(args.runs, args.warm_up)
+    print(f"⏱️ Import time: {result['import_seconds'] * 1000:.1f} ms")
+    print(f"⏱️ Time to first prediction: {result['first_prediction_seconds'] * 1000:.1f} ms")
+    print(json.dumps(result))
+
+if __name__ == '__main__':
+    main()
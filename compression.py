@@ -0,0 +1,80 @@
+import gzip
+import hashlib
+from datetime import datetime, timezone
+from flask import current_app, request
+from werkzeug.http import http_date
+from json_provider import dumps
+
+# Brotli is optional; without it responses are only offered gzip-compressed
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Bodies smaller than this are sent uncompressed; the headers would outweigh the savings
+MIN_COMPRESS_SIZE = 512
+
+# Content codings the server can produce, most preferred first
+ENCODINGS = ('br', 'gzip') if brotli else ('gzip',)
+
+def compress(body, encoding):
+    """Compress a response body with the given content coding"""
+    if encoding == 'br':
+        return brotli.compress(body)
+    return gzip.compress(body, compresslevel=6, mtime=0)
+
+class PrecomputedJSON:
+    """A JSON body encoded and compressed once, then served with an ETag and conditional GET"""
+    
+    def __init__(self, payload, last_modified=None):
+        # Same bytes jsonify() would produce for the payload
+        body = dumps(payload) + b'\n'
+        self.bodies = {None: body}
+        if len(body) >= MIN_COMPRESS_SIZE:
+            for encoding in ENCODINGS:
+                self.bodies[encoding] = compress(body, encoding)
+        
+        # HTTP dates have whole seconds, so If-Modified-Since is compared at that precision
+        self.last_modified = None
+        if last_modified is not None:
+            self.last_modified = datetime.fromtimestamp(int(last_modified), timezone.utc)
+        
+        # Content hash of the uncompressed body; each encoding is its own representation with its
+        # own ETag. Headers are built here too, since Werkzeug's header setters cost more than the body
+        content_hash = hashlib.sha256(body).hexdigest()[:16]
+        self.headers = {}
+        for encoding in self.bodies:
+            etag = f'{content_hash}-{encoding}' if encoding else content_hash
+            headers = [('Content-Type', 'application/json'), ('ETag', f'"{etag}"'),
+                       ('Vary', 'Accept-Encoding'), ('Cache-Control', 'no-cache')]
+            if encoding:
+                headers.append(('Content-Encoding', encoding))
+            if self.last_modified is not None:
+                headers.append(('Last-Modified', http_date(self.last_modified)))
+            self.headers[encoding] = (etag, headers)
+    
+    def response(self):
+        """The body in the best accepted encoding, or 304 Not Modified if the client has it"""
+        if_none_match = request.if_none_match if 'If-None-Match' in request.headers else None
+        status, headers, body = self.select(request.accept_encodings, if_none_match, request.if_modified_since)
+        return current_app.response_class(body, status=status, headers=headers)
+    
+    def select(self, accept_encodings, if_none_match=None, if_modified_since=None):
+        """(status, headers, body) for a request's parsed Accept-Encoding and validators"""
+        encoding = accept_encodings.best_match(ENCODINGS)
+        if encoding not in self.bodies:
+            encoding = None
+        
+        etag, headers = self.headers[encoding]
+        if self.not_modified(etag, if_none_match, if_modified_since):
+            return 304, headers, b''
+        return 200, headers, self.bodies[encoding]
+    
+    def not_modified(self, etag, if_none_match, if_modified_since):
+        """Whether the request's validators match this representation"""
+        # If-None-Match takes precedence; weak matching also accepts tags weakened by proxies
+        if if_none_match is not None:
+            return if_none_match.contains_weak(etag)
+        if self.last_modified is not None and if_modified_since is not None:
+            return self.last_modified <= if_modified_since
+        return False
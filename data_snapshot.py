@@ -0,0 +1,145 @@
+import csv
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import numpy as np
+
+SOURCE_PATH = 'data/yield_df.csv'
+CACHE_DIR = 'data/cache'
+
+# Year stored for rows whose Year field is not a number
+MISSING_YEAR = -1
+
+# Snapshot columns, their source CSV fields and storage dtypes
+NUMERIC_FIELDS = {
+    'rainfall': 'average_rain_fall_mm_per_year',
+    'pesticides': 'pesticides_tonnes',
+    'temperature': 'avg_temp',
+    'yield': 'hg/ha_yield'
+}
+COLUMN_DTYPES = {
+    'source_index': np.int32,
+    'area': np.int16,
+    'item': np.int16,
+    'year': np.int16,
+    'rainfall': np.float64,
+    'pesticides': np.float64,
+    'temperature': np.float64,
+    'yield': np.float64
+}
+
+def file_sha256(path):
+    """Hash a file in blocks"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def snapshot_prefix(source_path):
+    """Name prefix shared by every snapshot of source_path"""
+    # Sources with the same file name in different directories must not share snapshots
+    name = os.path.splitext(os.path.basename(source_path))[0]
+    path_hash = hashlib.sha256(os.path.normpath(source_path).encode('utf-8')).hexdigest()[:8]
+    return f'{name}-{path_hash}-'
+
+def snapshot_dir(source_path=SOURCE_PATH, cache_dir=CACHE_DIR, source_hash=None):
+    """Directory holding the snapshot for the current contents of source_path"""
+    source_hash = source_hash or file_sha256(source_path)
+    return os.path.join(cache_dir, snapshot_prefix(source_path) + source_hash[:16])
+
+def load_snapshot(source_path=SOURCE_PATH, cache_dir=CACHE_DIR):
+    """Memory-map the columnar snapshot of source_path, rebuilding it if the CSV changed"""
+    # columns are read-only arrays sorted by (area, item, year); meta['categories'] decodes area/item
+    source_hash = file_sha256(source_path)
+    path = snapshot_dir(source_path, cache_dir, source_hash)
+    
+    if not os.path.exists(os.path.join(path, 'meta.json')):
+        build_snapshot(source_path, path, source_hash)
+        remove_stale_snapshots(source_path, cache_dir, keep=path)
+    
+    with open(os.path.join(path, 'meta.json'), 'r') as f:
+        meta = json.load(f)
+    
+    columns = {
+        name: np.load(os.path.join(path, f'{name}.npy'), mmap_mode='r')
+        for name in COLUMN_DTYPES
+    }
+    return columns, meta
+
+def build_snapshot(source_path, path, source_hash):
+    """Parse the yield CSV once and write it as one .npy file per column"""
+    print(f"Building data snapshot for {source_path}...")
+    
+    rows = {name: [] for name in COLUMN_DTYPES}
+    with open(source_path, 'r', encoding='utf-8') as file:
+        reader = csv.DictReader(file)
+        for index, row in enumerate(reader):
+            if not (row.get('Area') and row.get('Item') and row.get('hg/ha_yield')):
+                continue
+            try:
+                values = {
+                    name: float(row[field]) if row[field] else np.nan
+                    for name, field in NUMERIC_FIELDS.items()
+                }
+            except (ValueError, KeyError):
+                continue
+            
+            rows['source_index'].append(index)
+            rows['area'].append(row['Area'].lower().strip())
+            rows['item'].append(row['Item'].lower().strip())
+            rows['year'].append(int(row['Year']) if row['Year'].isdigit() else MISSING_YEAR)
+            for name, value in values.items():
+                rows[name].append(value)
+    
+    # Encode areas and items against their sorted category lists
+    categories = {name: sorted(set(rows[name])) for name in ('area', 'item')}
+    for name, labels in categories.items():
+        codes = {label: code for code, label in enumerate(labels)}
+        rows[name] = [codes[label] for label in rows[name]]
+    
+    columns = {name: np.array(values, dtype=COLUMN_DTYPES[name]) for name, values in rows.items()}
+    
+    # Sort by (area, item, year) so each (area, item) group is a contiguous slice
+    order = np.lexsort((columns['year'], columns['item'], columns['area']))
+    columns = {name: values[order] for name, values in columns.items()}
+    
+    meta = {
+        'source': source_path,
+        'source_sha256': source_hash,
+        'rows': len(order),
+        'categories': categories,
+        'columns': {name: np.dtype(dtype).name for name, dtype in COLUMN_DTYPES.items()}
+    }
+    
+    # Write into a temporary directory and rename it into place so readers never see a partial snapshot
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = tempfile.mkdtemp(dir=os.path.dirname(path) or '.', prefix='.snapshot-')
+    try:
+        for name, values in columns.items():
+            np.save(os.path.join(tmp_path, f'{name}.npy'), values)
+        with open(os.path.join(tmp_path, 'meta.json'), 'w') as f:
+            json.dump(meta, f)
+        os.rename(tmp_path, path)
+    except OSError:
+        # Another process may have built the same snapshot first
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        if not os.path.exists(os.path.join(path, 'meta.json')):
+            raise
+    
+    print(f"Snapshot with {meta['rows']} rows saved to {path}")
+
+def remove_stale_snapshots(source_path, cache_dir, keep):
+    """Delete snapshots built from earlier versions of source_path"""
+    prefix = snapshot_prefix(source_path)
+    for name in os.listdir(cache_dir):
+        path = os.path.join(cache_dir, name)
+        if name.startswith(prefix) and os.path.abspath(path) != os.path.abspath(keep):
+            shutil.rmtree(path, ignore_errors=True)
+
+if __name__ == '__main__':
+    columns, meta = load_snapshot()
+    print(f"✅ Snapshot ready: {meta['rows']} rows, "
+          f"{len(meta['categories']['area'])} areas, {len(meta['categories']['item'])} crops")
@@ -0,0 +1,190 @@
+import argparse
+import json
+import os
+import unicodedata
+import numpy as np
+import pandas as pd
+
+DATA_DIR = 'data'
+FEATURES_DIR = 'data/cache/features'
+
+# Bump when the cleaning or join logic changes so cached partitions are rebuilt
+PIPELINE_VERSION = 1
+
+# Output table with the same columns as data/yield_df.csv
+OUTPUT_FILE = 'yield_df.csv'
+OUTPUT_COLUMNS = ['Area', 'Item', 'Year', 'hg/ha_yield', 'average_rain_fall_mm_per_year',
+                  'pesticides_tonnes', 'avg_temp']
+
+# Country names used by the rainfall and temperature sources, mapped to FAO names (normalized)
+COUNTRY_ALIASES = {
+    'russia': 'russian federation',
+    'united states': 'united states of america',
+    'tanzania': 'united republic of tanzania',
+    'iran': 'iran (islamic republic of)',
+    'bolivia': 'bolivia (plurinational state of)',
+    'venezuela': 'venezuela (bolivarian republic of)',
+    'venezuela, rb': 'venezuela (bolivarian republic of)',
+    'congo, dem. rep.': 'democratic republic of the congo',
+    'congo (democratic republic of the)': 'democratic republic of the congo',
+    'congo, rep.': 'congo',
+    'czech republic': 'czechia',
+    'macedonia': 'the former yugoslav republic of macedonia',
+    'lao pdr': "lao people's democratic republic",
+    'laos': "lao people's democratic republic",
+    'north korea': "democratic people's republic of korea",
+    'south korea': 'republic of korea',
+    'moldova': 'republic of moldova',
+    'syria': 'syrian arab republic',
+    'slovak republic': 'slovakia',
+    'kyrgyz republic': 'kyrgyzstan',
+    'hong kong': 'china, hong kong sar',
+    'hong kong sar, china': 'china, hong kong sar',
+    'taiwan': 'china, taiwan province of',
+    'micronesia': 'micronesia (federated states of)',
+    'vietnam': 'viet nam',
+    'guinea bissau': 'guinea-bissau',
+    'st. kitts and nevis': 'saint kitts and nevis',
+    'st. lucia': 'saint lucia',
+    'st. vincent and the grenadines': 'saint vincent and the grenadines'
+}
+
+def normalize_country(name):
+    """Lowercase, strip accents and whitespace, and map known aliases to the FAO name"""
+    name = unicodedata.normalize('NFKD', str(name)).encode('ascii', 'ignore').decode('ascii')
+    name = ' '.join(name.lower().split())
+    return COUNTRY_ALIASES.get(name, name)
+
+def country_keys(names):
+    """Normalize a column of country names, computing each distinct name once"""
+    names = names.astype('category')
+    return names.cat.rename_categories([normalize_country(name) for name in names.cat.categories])
+
+def load_sources(data_dir=DATA_DIR):
+    """Read and clean the four raw sources into (key, Year, value) tables"""
+    yields = pd.read_csv(os.path.join(data_dir, 'yield.csv'),
+                         usecols=['Area', 'Element', 'Item', 'Year', 'Value'],
+                         dtype={'Area': 'category', 'Element': 'category', 'Item': 'category'})
+    yields = yields[yields['Element'] == 'Yield'].dropna(subset=['Value'])
+    yields = pd.DataFrame({
+        'key': country_keys(yields['Area'].astype(str)).astype(str),
+        'Area': yields['Area'].astype(str),
+        'Item': yields['Item'].astype(str),
+        'Year': yields['Year'].astype(np.int16),
+        'hg/ha_yield': yields['Value'].astype(np.int64)
+    })
+    
+    rainfall = pd.read_csv(os.path.join(data_dir, 'rainfall.csv'))
+    rainfall.columns = [column.strip() for column in rainfall.columns]
+    rainfall = pd.DataFrame({
+        'key': country_keys(rainfall['Area']).astype(str),
+        'Year': rainfall['Year'].astype(np.int16),
+        'average_rain_fall_mm_per_year': pd.to_numeric(rainfall['average_rain_fall_mm_per_year'], errors='coerce')
+    }).dropna()
+    
+    pesticides = pd.read_csv(os.path.join(data_dir, 'pesticides.csv'),
+                             usecols=['Area', 'Element', 'Year', 'Value'])
+    pesticides = pesticides[pesticides['Element'] == 'Use'].dropna(subset=['Value'])
+    pesticides = pd.DataFrame({
+        'key': country_keys(pesticides['Area']).astype(str),
+        'Year': pesticides['Year'].astype(np.int16),
+        'pesticides_tonnes': pesticides['Value'].astype(np.float64)
+    })
+    
+    # temp.csv has one row per city; average them into one value per country and year
+    temp = pd.read_csv(os.path.join(data_dir, 'temp.csv')).dropna(subset=['avg_temp'])
+    temp = pd.DataFrame({
+        'key': country_keys(temp['country']).astype(str),
+        'Year': temp['year'].astype(np.int16),
+        'avg_temp': temp['avg_temp']
+    }).groupby(['key', 'Year'], as_index=False, observed=True)['avg_temp'].mean()
+    temp['avg_temp'] = temp['avg_temp'].round(2)
+    
+    # Keep a single value per country and year in the climate sources
+    rainfall = rainfall.drop_duplicates(['key', 'Year'])
+    pesticides = pesticides.groupby(['key', 'Year'], as_index=False)['pesticides_tonnes'].sum()
+    
+    return {'yield': yields, 'rainfall': rainfall, 'pesticides': pesticides, 'temp': temp}
+
+def year_fingerprints(sources):
+    """Hash every source's rows per year so changed years can be found"""
+    # Only years with yield records can produce joined rows
+    fingerprints = {int(year): [] for year in sources['yield']['Year'].unique()}
+    for name, frame in sorted(sources.items()):
+        hashes = pd.util.hash_pandas_object(frame, index=False)
+        for year, value in hashes.groupby(frame['Year'].to_numpy()).sum().items():
+            if int(year) in fingerprints:
+                fingerprints[int(year)].append(f'{name}:{int(value) & 0xFFFFFFFFFFFFFFFF:016x}')
+    return {year: ','.join(parts) for year, parts in fingerprints.items()}
+
+def join_sources(sources, years):
+    """Join yield with rainfall, pesticides and temperature for the given years"""
+    frames = {name: frame[frame['Year'].isin(years)] for name, frame in sources.items()}
+    
+    # Join keys share one categorical dtype so the merges compare integer codes
+    keys = pd.CategoricalDtype(sorted(set().union(*(frame['key'] for frame in frames.values()))))
+    frames = {name: frame.astype({'key': keys}) for name, frame in frames.items()}
+    
+    joined = frames['yield']
+    for name in ('rainfall', 'pesticides', 'temp'):
+        joined = joined.merge(frames[name], on=['key', 'Year'], how='inner')
+    
+    return joined.sort_values(['Year', 'Area', 'Item'])[OUTPUT_COLUMNS].reset_index(drop=True)
+
+def build_features(data_dir=DATA_DIR, features_dir=FEATURES_DIR, force=False):
+    """Rebuild the joined yield table from the raw CSVs, re-joining only years whose inputs changed"""
+    print("Building features from raw datasets...")
+    os.makedirs(features_dir, exist_ok=True)
+    manifest_path = os.path.join(features_dir, 'manifest.json')
+    
+    manifest = {}
+    if os.path.exists(manifest_path) and not force:
+        with open(manifest_path, 'r') as f:
+            manifest = json.load(f)
+    if manifest.get('pipeline_version') != PIPELINE_VERSION:
+        manifest = {'pipeline_version': PIPELINE_VERSION, 'years': {}}
+    
+    sources = load_sources(data_dir)
+    fingerprints = {str(year): value for year, value in year_fingerprints(sources).items()}
+    cached = manifest['years']
+    
+    changed = sorted(int(year) for year, value in fingerprints.items() if cached.get(year) != value)
+    removed = [year for year in cached if year not in fingerprints]
+    
+    # Re-join only the changed years and store one partition per year
+    if changed:
+        joined = join_sources(sources, changed)
+        for year in changed:
+            partition = joined[joined['Year'] == year]
+            partition.to_pickle(partition_path(features_dir, year))
+            cached[str(year)] = fingerprints[str(year)]
+    for year in removed:
+        if os.path.exists(partition_path(features_dir, year)):
+            os.remove(partition_path(features_dir, year))
+        del cached[year]
+    
+    partitions = [pd.read_pickle(partition_path(features_dir, year)) for year in sorted(cached, key=int)]
+    features = pd.concat(partitions, ignore_index=True) if partitions else pd.DataFrame(columns=OUTPUT_COLUMNS)
+    features['Area'] = features['Area'].astype(str)
+    features['Item'] = features['Item'].astype(str)
+    
+    # Only rewrite the combined table when something changed
+    output_path = os.path.join(features_dir, OUTPUT_FILE)
+    if changed or removed or not os.path.exists(output_path):
+        features.to_csv(output_path)
+    
+    with open(manifest_path, 'w') as f:
+        json.dump(manifest, f)
+    
+    print(f"Rebuilt {len(changed)} of {len(fingerprints)} years; {len(features)} joined rows")
+    return output_path
+
+def partition_path(features_dir, year):
+    """Cached joined rows for one year"""
+    return os.path.join(features_dir, f'year={year}.pkl')
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build the joined yield table from the raw FAO CSVs')
+    parser.add_argument('--force', action='store_true', help='rebuild every year')
+    args = parser.parse_args()
+    print(f"✅ Features saved to: {build_features(force=args.force)}")
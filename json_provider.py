@@ -0,0 +1,42 @@
+import json
+from flask.json.provider import DefaultJSONProvider
+
+# orjson is in requirements.txt; the standard library encoder is kept as a fallback for
+# environments that install the app without it
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Sorted keys like Flask's default provider; NumPy scalars from the model are encoded natively
+ORJSON_OPTIONS = (orjson.OPT_SORT_KEYS | orjson.OPT_SERIALIZE_NUMPY) if orjson else 0
+
+def dumps(obj):
+    """Compact JSON bytes with sorted keys, using orjson when it is installed"""
+    if orjson is not None:
+        return orjson.dumps(obj, option=ORJSON_OPTIONS)
+    return json.dumps(obj, sort_keys=True, separators=(',', ':')).encode('utf-8')
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider backed by orjson, falling back to the default provider without it"""
+    
+    def dumps(self, obj, **kwargs):
+        # Options such as indent are only understood by the standard library encoder
+        if orjson is None or kwargs:
+            return super().dumps(obj, **kwargs)
+        return orjson.dumps(obj, default=self.default, option=ORJSON_OPTIONS).decode('utf-8')
+    
+    def loads(self, s, **kwargs):
+        if orjson is None or kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+    
+    def response(self, *args, **kwargs):
+        """jsonify() responses, encoded straight to bytes"""
+        # Compact in debug mode too, so `python app.py` serves the same bytes as production;
+        # set app.json.compact = False for the standard library's indented output
+        if orjson is None or self.compact is False:
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        body = orjson.dumps(obj, default=self.default, option=ORJSON_OPTIONS | orjson.OPT_APPEND_NEWLINE)
+        return self._app.response_class(body, mimetype=self.mimetype)
@@ -0,0 +1,146 @@
+import bisect
+import threading
+import time
+
+# Histogram buckets in seconds, from a few microseconds (single stages) up to slow requests
+DEFAULT_BUCKETS = (0.000005, 0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005,
+                   0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+def format_labels(names, values, extra=()):
+    """Render a Prometheus label set"""
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+def format_value(value):
+    """Render a sample value the way the text format expects"""
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Counter:
+    """Monotonic counter with optional labels"""
+    
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+    
+    def inc(self, *labels, amount=1):
+        """Add amount to the counter for the given label values"""
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+    
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} counter']
+        with self._lock:
+            values = sorted(self._values.items())
+        for labels, value in values:
+            lines.append(f'{self.name}{format_labels(self.labelnames, labels)} {format_value(value)}')
+        return lines
+
+class Histogram:
+    """Histogram of observed values (usually seconds) with optional labels"""
+    
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # label values -> [per-bucket counts (last one is +Inf), sum]
+        self._values = {}
+        self._lock = threading.Lock()
+    
+    def observe(self, value, *labels):
+        """Record one observation for the given label values"""
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][index] += 1
+            entry[1] += value
+    
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            values = sorted((labels, (list(counts), total)) for labels, (counts, total) in self._values.items())
+        for labels, (counts, total) in values:
+            # Buckets are cumulative in the exposition format
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                bucket_labels = format_labels(self.labelnames, labels, [('le', format_value(bound))])
+                lines.append(f'{self.name}_bucket{bucket_labels} {cumulative}')
+            label_text = format_labels(self.labelnames, labels)
+            lines.append(f'{self.name}_sum{label_text} {format_value(total)}')
+            lines.append(f'{self.name}_count{label_text} {cumulative}')
+        return lines
+
+class CallbackMetric:
+    """Gauge or counter whose samples are read from a callback when metrics are rendered"""
+    
+    def __init__(self, name, documentation, callback, metric_type='gauge', labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.metric_type = metric_type
+        self.labelnames = tuple(labelnames)
+        # callback returns a number, or a dict of label value tuples -> number
+        self.callback = callback
+    
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.metric_type}']
+        values = self.callback()
+        if not isinstance(values, dict):
+            values = {(): values}
+        for labels, value in sorted(values.items()):
+            if value is not None:
+                lines.append(f'{self.name}{format_labels(self.labelnames, labels)} {format_value(value)}')
+        return lines
+
+class Registry:
+    """Collection of metrics rendered together in the Prometheus text format"""
+    
+    def __init__(self):
+        self.metrics = []
+    
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+    
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+    
+    def callback(self, name, documentation, callback, metric_type='gauge', labelnames=()):
+        return self.register(CallbackMetric(name, documentation, callback, metric_type, labelnames))
+    
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+    
+    def render(self):
+        """All metrics in the text exposition format"""
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+class StageTimer:
+    """Records the time since the previous mark into a per-stage histogram"""
+    
+    __slots__ = ('histogram', 'last')
+    
+    def __init__(self, histogram):
+        self.histogram = histogram
+        self.last = time.perf_counter()
+    
+    def mark(self, stage):
+        """Observe the time spent in stage, which ends now"""
+        now = time.perf_counter()
+        self.histogram.observe(now - self.last, stage)
+        self.last = now
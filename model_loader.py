@@ -0,0 +1,243 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from types import MappingProxyType
+import numpy as np
+from tree_inference import FlatTreeRegressor
+from prediction_grid import PredictionGrid
+from shard_router import ShardRouter, SHARDS_DIR, SHARD_MANIFEST_FILE, read_manifest
+
+MODELS_DIR = 'models'
+
+# Seconds between checks of the models directory for retrained artifacts (0 disables watching)
+MODEL_WATCH_INTERVAL = float(os.environ.get('MODEL_WATCH_INTERVAL', 0))
+
+# Artifacts written by model_training.py
+TREE_FILE = 'crop_yield_tree.npz'
+MODEL_FILE = 'crop_yield_model.pkl'
+AREA_ENCODER_FILE = 'area_encoder.pkl'
+ITEM_ENCODER_FILE = 'item_encoder.pkl'
+ENCODER_CLASSES_FILE = 'encoder_classes.json'
+UNIQUE_AREAS_FILE = 'unique_areas.txt'
+UNIQUE_ITEMS_FILE = 'unique_items.txt'
+
+def encoder_mapping(encoder):
+    """Build a read-only label -> code mapping from a fitted LabelEncoder"""
+    labels = [str(label) for label in encoder.classes_]
+    mapping = {label: code for code, label in enumerate(labels)}
+    
+    # The mapping replaces encoder.transform, so make sure it gives the same codes
+    if labels and list(encoder.transform(labels)) != list(mapping.values()):
+        raise ValueError('Encoder mapping does not match LabelEncoder.transform')
+    
+    return MappingProxyType(mapping)
+
+def classes_mapping(labels):
+    """Build the same read-only mapping from exported encoder classes"""
+    return MappingProxyType({label: code for code, label in enumerate(labels)})
+
+def artifact_files(models_dir=MODELS_DIR):
+    """Names and paths of the files in models_dir, plus the shard manifest"""
+    try:
+        entries = sorted(os.scandir(models_dir), key=lambda entry: entry.name)
+    except FileNotFoundError:
+        return []
+    files = [(entry.name, entry.path) for entry in entries if entry.is_file()]
+    
+    # Retraining shards rewrites the shard manifest, so it versions the sharded model
+    manifest_path = os.path.join(models_dir, SHARDS_DIR, SHARD_MANIFEST_FILE)
+    if os.path.exists(manifest_path):
+        files.append((f'{SHARDS_DIR}/{SHARD_MANIFEST_FILE}', manifest_path))
+    return files
+
+def artifact_signature(models_dir=MODELS_DIR):
+    """Names, sizes and modification times of the artifacts; cheap enough to poll for changes"""
+    signature = []
+    for name, path in artifact_files(models_dir):
+        stat = os.stat(path)
+        signature.append((name, stat.st_mtime_ns, stat.st_size))
+    return tuple(signature)
+
+def artifact_version(models_dir=MODELS_DIR):
+    """Hash of the artifact names and contents, so a checkout, copy or deploy keeps the version"""
+    digest = hashlib.sha1()
+    for name, path in artifact_files(models_dir):
+        with open(path, 'rb') as f:
+            digest.update(name.encode('utf-8') + b'\0' + hashlib.sha1(f.read()).digest())
+    return digest.hexdigest()[:12]
+
+def read_lines(path):
+    """Read a list of names, one per line"""
+    with open(path, 'r') as f:
+        return [line.strip() for line in f.readlines()]
+
+class ModelBundle:
+    """A trained model together with the encoders and category lists it was trained with"""
+    
+    def __init__(self, model, area_codes, item_codes, unique_areas, unique_items, version, grid=None,
+                 modified_at=None):
+        self.model = model
+        self.area_codes = area_codes
+        self.item_codes = item_codes
+        self.unique_areas = unique_areas
+        self.unique_items = unique_items
+        self.version = version
+        self.grid = grid
+        self.loaded_at = time.time()
+        # When the newest artifact was written, i.e. when this model was trained
+        self.modified_at = modified_at
+        # Response bodies that only depend on this bundle, built on first use
+        self.responses = {}
+    
+    def predict(self, features):
+        """Predict yields for a 2-D feature array"""
+        return self.model.predict(features)
+    
+    def predict_one(self, features):
+        """Predict the yield for a single feature row"""
+        if isinstance(self.model, (FlatTreeRegressor, ShardRouter)):
+            return self.model.predict_one(features)
+        return self.model.predict(np.array([features]))[0]
+
+def load_bundle(models_dir=MODELS_DIR):
+    """Load the model, encoders and category lists from models_dir"""
+    tree_path = os.path.join(models_dir, TREE_FILE)
+    model_path = os.path.join(models_dir, MODEL_FILE)
+    classes_path = os.path.join(models_dir, ENCODER_CLASSES_FILE)
+    
+    # Any change to the artifact contents gives the bundle a new version
+    version = artifact_version(models_dir)
+    signature = artifact_signature(models_dir)
+    modified_at = max((mtime_ns for _, mtime_ns, _ in signature), default=0) / 1e9 or None
+    
+    # Flat tree exported by model_training.py, used instead of the pickled sklearn model
+    if os.path.exists(tree_path):
+        model = FlatTreeRegressor.load(tree_path)
+    else:
+        # joblib and the sklearn classes it unpickles are only imported when actually needed
+        import joblib
+        model = joblib.load(model_path)
+        if hasattr(model, 'tree_'):
+            model = FlatTreeRegressor.from_sklearn(model)
+    
+    # Constant-time membership checks and encoding on the request path
+    if os.path.exists(classes_path):
+        with open(classes_path, 'r') as f:
+            classes = json.load(f)
+        area_codes = classes_mapping(classes['area'])
+        item_codes = classes_mapping(classes['item'])
+    else:
+        import joblib
+        area_codes = encoder_mapping(joblib.load(os.path.join(models_dir, AREA_ENCODER_FILE)))
+        item_codes = encoder_mapping(joblib.load(os.path.join(models_dir, ITEM_ENCODER_FILE)))
+    
+    unique_areas = read_lines(os.path.join(models_dir, UNIQUE_AREAS_FILE))
+    unique_items = read_lines(os.path.join(models_dir, UNIQUE_ITEMS_FILE))
+    
+    # Route requests to per-area or per-crop shards when they were trained, falling
+    # back to the global tree for keys without a shard
+    manifest = read_manifest(models_dir)
+    if manifest is not None:
+        key_codes = area_codes if manifest['shard_by'] == 'area' else item_codes
+        model = ShardRouter(os.path.join(models_dir, SHARDS_DIR), manifest, key_codes, fallback=model)
+    
+    # Precomputed predictions, used only if they were built from these artifacts
+    grid = PredictionGrid.load(models_dir, version)
+    
+    return ModelBundle(model, area_codes, item_codes, unique_areas, unique_items, version, grid, modified_at)
+
+class ModelHolder:
+    """Thread-safe holder that loads the model bundle on first use and can swap in a new one"""
+    
+    def __init__(self, models_dir=MODELS_DIR):
+        self.models_dir = models_dir
+        self.error = None
+        self.reloads = 0
+        self._bundle = None
+        self._lock = threading.Lock()
+        self._watcher = None
+        self._watch_interval = None
+    
+    def get(self):
+        """Return the loaded bundle, loading it on first call, or None if loading failed"""
+        bundle = self._bundle
+        if bundle is not None:
+            return bundle
+        
+        with self._lock:
+            if self._bundle is None:
+                try:
+                    self._bundle = load_bundle(self.models_dir)
+                    self.error = None
+                    print("✅ Model and encoders loaded successfully!")
+                except Exception as e:
+                    self.error = str(e)
+                    print(f"❌ Error loading model: {e}")
+            return self._bundle
+    
+    def current(self):
+        """Return the bundle currently loaded, without loading one"""
+        return self._bundle
+    
+    def reload(self):
+        """Load a fresh bundle and swap it in; requests already running keep the old one"""
+        with self._lock:
+            try:
+                bundle = load_bundle(self.models_dir)
+            except Exception as e:
+                # Keep serving the current bundle if the new artifacts cannot be loaded
+                self.error = str(e)
+                print(f"❌ Error reloading model: {e}")
+                raise
+            
+            # A single reference assignment, so readers see either the old or the new bundle
+            self._bundle = bundle
+            self.error = None
+            self.reloads += 1
+            print(f"🔄 Model reloaded (version {bundle.version})")
+            return bundle
+    
+    def watch(self, interval=MODEL_WATCH_INTERVAL):
+        """Start a background thread that reloads the bundle when the models directory changes"""
+        if self._watcher is None and interval > 0:
+            self._watch_interval = interval
+            self._watcher = threading.Thread(target=self._watch_loop, args=(interval,), daemon=True)
+            self._watcher.start()
+        return self._watcher
+    
+    def _watch_loop(self, interval):
+        """Poll the artifact signature and reload once it has changed and settled"""
+        current = artifact_signature(self.models_dir)
+        while True:
+            time.sleep(interval)
+            signature = artifact_signature(self.models_dir)
+            if signature == current:
+                continue
+            
+            # model_training.py writes several files; wait until they stop changing
+            time.sleep(interval)
+            if artifact_signature(self.models_dir) != signature:
+                continue
+            
+            current = signature
+            try:
+                self.reload()
+            except Exception:
+                pass
+    
+    def after_fork(self):
+        """Reset thread state inherited by a forked worker and restart its model watcher"""
+        self._lock = threading.Lock()
+        interval, self._watch_interval = self._watch_interval, None
+        self._watcher = None
+        if interval:
+            self.watch(interval)
+    
+    def warm_up(self):
+        """Load the bundle and run one prediction so the first request is not slow"""
+        bundle = self.get()
+        if bundle is not None and bundle.unique_areas and bundle.unique_items:
+            bundle.predict_one([0, 0, 2024, 1000.0, 100.0, 20.0])
+        return bundle
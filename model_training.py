@@ -1,29 +1,57 @@
 import pandas as pd
 import numpy as np
 from sklearn.tree import DecisionTreeRegressor
-from sklearn.model_selection import train_test_split
+from sklearn.ensemble import RandomForestRegressor, HistGradientBoostingRegressor
+from sklearn.base import clone
+from sklearn.model_selection import train_test_split, KFold
 from sklearn.preprocessing import LabelEncoder
 from sklearn.metrics import mean_squared_error, r2_score
 import joblib
+import argparse
+import json
+import os
+import pickle
+import shutil
+import time
+from datetime import datetime
+from joblib import Parallel, delayed
 import warnings
+from tree_inference import FlatTreeRegressor
+from data_snapshot import load_snapshot, MISSING_YEAR, SOURCE_PATH
+from feature_pipeline import build_features
+from model_loader import encoder_mapping
+from shard_router import SHARD_COLUMNS, SHARDS_DIR, SHARD_MANIFEST_FILE, shard_file, read_manifest
+from streaming_ingest import ingest_csv, open_store, peak_memory_mb, STORE_DIR, CHUNK_SIZE
 warnings.filterwarnings('ignore')
 
-def load_and_preprocess_data():
+def snapshot_frame(columns, meta):
+    """Rebuild the yield_df.csv table from its columnar snapshot, in source row order"""
+    order = np.argsort(columns['source_index'])
+    areas = np.array(meta['categories']['area'], dtype=object)
+    items = np.array(meta['categories']['item'], dtype=object)
+    
+    frame = pd.DataFrame({
+        'Area': areas[columns['area'][order]],
+        'Item': items[columns['item'][order]],
+        'Year': columns['year'][order],
+        'hg/ha_yield': columns['yield'][order],
+        'average_rain_fall_mm_per_year': columns['rainfall'][order],
+        'pesticides_tonnes': columns['pesticides'][order],
+        'avg_temp': columns['temperature'][order]
+    })
+    
+    # Rows without a numeric year are dropped like any other missing value
+    return frame[frame['Year'] != MISSING_YEAR]
+
+def load_and_preprocess_data(source_path=SOURCE_PATH):
     """Load and preprocess the crop yield datasets"""
     print("Loading datasets...")
     
-    # Load the main yield dataset
-    yield_df = pd.read_csv('data/yield_df.csv')
-    
-    # Load additional datasets for feature engineering
-    temp_df = pd.read_csv('data/temp.csv')
-    rainfall_df = pd.read_csv('data/rainfall.csv')
-    pesticides_df = pd.read_csv('data/pesticides.csv')
+    # Load the joined yield dataset from its memory-mapped snapshot. The temperature,
+    # rainfall and pesticides datasets are joined in by feature_pipeline.py
+    yield_df = snapshot_frame(*load_snapshot(source_path))
     
     print(f"Main dataset shape: {yield_df.shape}")
-    print(f"Temperature dataset shape: {temp_df.shape}")
-    print(f"Rainfall dataset shape: {rainfall_df.shape}")
-    print(f"Pesticides dataset shape: {pesticides_df.shape}")
     
     # Clean the main dataset
     yield_df = yield_df.dropna()
@@ -48,14 +76,26 @@ def load_and_preprocess_data():
     X = yield_df[features]
     y = yield_df[target]
     
+    # Save unique areas and items for the frontend
+    unique_areas = sorted(yield_df['Area'].unique())
+    unique_items = sorted(yield_df['Item'].unique())
+    
+    return X, y, unique_areas, unique_items, (area_encoder, item_encoder)
+
+def save_encoders(area_encoder, item_encoder, unique_areas, unique_items):
+    """Save the encoders, their exported classes and the category lists"""
     # Save encoders for later use
     joblib.dump(area_encoder, 'models/area_encoder.pkl')
     joblib.dump(item_encoder, 'models/item_encoder.pkl')
     
-    # Save unique areas and items for the frontend
-    unique_areas = sorted(yield_df['Area'].unique())
-    unique_items = sorted(yield_df['Item'].unique())
+    # Export the encoder classes so the server can encode without unpickling sklearn objects
+    with open('models/encoder_classes.json', 'w') as f:
+        json.dump({
+            'area': list(encoder_mapping(area_encoder)),
+            'item': list(encoder_mapping(item_encoder))
+        }, f)
     
+    # Save unique areas and items for the frontend
     with open('models/unique_areas.txt', 'w') as f:
         for area in unique_areas:
             f.write(f"{area}\n")
@@ -63,8 +103,46 @@ def load_and_preprocess_data():
     with open('models/unique_items.txt', 'w') as f:
         for item in unique_items:
             f.write(f"{item}\n")
+
+def encoders_match_saved(area_encoder, item_encoder):
+    """Whether models/ holds a tree trained with these encoders' classes"""
+    if not os.path.exists('models/crop_yield_tree.npz'):
+        return False
+    try:
+        with open('models/encoder_classes.json', 'r') as f:
+            saved = json.load(f)
+    except (OSError, ValueError):
+        return False
+    return saved == {'area': list(encoder_mapping(area_encoder)), 'item': list(encoder_mapping(item_encoder))}
+
+def load_store_data(store_dir=STORE_DIR):
+    """Load training features from the on-disk store written by streaming_ingest.py"""
+    print(f"Loading columnar store from {store_dir}...")
+    columns, meta = open_store(store_dir)
+    print(f"Store rows: {meta['rows']}")
+    
+    # The store numbers categories in first-seen order; renumber them in the sorted
+    # order a LabelEncoder uses so the exported encoders stay compatible
+    encoders = {}
+    codes = {}
+    for name in ('area', 'item'):
+        labels = meta['categories'][name]
+        encoders[name] = LabelEncoder().fit(labels)
+        ranks = np.empty(len(labels), dtype=np.int32)
+        ranks[np.argsort(labels)] = np.arange(len(labels), dtype=np.int32)
+        codes[name] = ranks[columns[name]]
+    
+    # One compact float32 matrix (what the tree trains on) instead of a DataFrame copy
+    X = np.empty((meta['rows'], 6), dtype=np.float32)
+    for index, values in enumerate([codes['area'], codes['item'], columns['year'],
+                                    columns['rainfall'], columns['pesticides'], columns['temperature']]):
+        X[:, index] = values
+    y = columns['yield']
+    
+    unique_areas = sorted(meta['categories']['area'])
+    unique_items = sorted(meta['categories']['item'])
     
-    return X, y, unique_areas, unique_items
+    return X, y, unique_areas, unique_items, (encoders['area'], encoders['item'])
 
 def train_model(X, y):
     """Train the Decision Tree Regressor model"""
@@ -93,25 +171,265 @@ def train_model(X, y):
     
     return model, X_test, y_test, y_pred
 
+def candidate_models():
+    """Models compared by --select-model"""
+    candidates = {
+        f'decision_tree_depth_{depth or "full"}': DecisionTreeRegressor(random_state=42, max_depth=depth)
+        for depth in (5, 8, 10, 12, 15, 20, None)
+    }
+    # Ensembles run single-threaded; the (model, fold) fits are already spread across cores
+    candidates['random_forest_100'] = RandomForestRegressor(n_estimators=100, max_depth=20, random_state=42, n_jobs=1)
+    candidates['hist_gradient_boosting'] = HistGradientBoostingRegressor(max_iter=300, random_state=42)
+    return candidates
+
+def row_latency_us(predict, features, repeats=200):
+    """Median time to predict a single row, in microseconds"""
+    timings = []
+    for row in features[:repeats]:
+        started = time.perf_counter()
+        predict(row)
+        timings.append(time.perf_counter() - started)
+    return float(np.median(timings) * 1e6)
+
+def score_fold(model, X, y, train, test):
+    """Fit a fresh copy of model on one fold and return its (R², MSE) on the held-out rows"""
+    model = clone(model).fit(X[train], y[train])
+    y_pred = model.predict(X[test])
+    return r2_score(y[test], y_pred), mean_squared_error(y[test], y_pred)
+
+def select_model(X, y, folds=5, report_path=None):
+    """Cross-validate candidate models in parallel and compare accuracy, speed and size"""
+    print(f"Comparing models with {folds}-fold cross-validation...")
+    
+    X = np.asarray(X, dtype=np.float32)
+    y = np.asarray(y)
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+    splits = list(KFold(n_splits=folds, shuffle=True, random_state=42).split(X))
+    candidates = candidate_models()
+    
+    # Every (model, fold) pair is one job, so all cores are used however few folds there are
+    jobs = [(name, train, test) for name in candidates for train, test in splits]
+    fold_scores = Parallel(n_jobs=-1)(
+        delayed(score_fold)(candidates[name], X, y, train, test) for name, train, test in jobs
+    )
+    scores = {name: [] for name in candidates}
+    for (name, _, _), score in zip(jobs, fold_scores):
+        scores[name].append(score)
+    
+    results = []
+    for name, model in candidates.items():
+        r2s, mses = np.array(scores[name]).T
+        
+        # Timings and size come from one fit on the training split, measured serially
+        started = time.perf_counter()
+        model.fit(X_train, y_train)
+        fit_time = time.perf_counter() - started
+        
+        started = time.perf_counter()
+        model.predict(X_test)
+        batch_us = (time.perf_counter() - started) / len(X_test) * 1e6
+        
+        result = {
+            'model': name,
+            'r2': float(np.mean(r2s)),
+            'r2_std': float(np.std(r2s)),
+            'mse': float(np.mean(mses)),
+            'fit_seconds': fit_time,
+            'batch_us_per_row': batch_us,
+            'single_row_us': row_latency_us(lambda row: model.predict(row.reshape(1, -1)), X_test),
+            'size_bytes': len(pickle.dumps(model))
+        }
+        
+        # Single trees are served as flat arrays, so also time that path
+        if isinstance(model, DecisionTreeRegressor):
+            tree = FlatTreeRegressor.from_sklearn(model)
+            result['flat_tree_row_us'] = row_latency_us(tree.predict_one, X_test)
+        
+        results.append(result)
+    
+    print(f"\n{'Model':<28}{'R²':>8}{'MSE':>16}{'Fit s':>8}{'Row µs':>10}{'Batch µs':>10}{'Size KB':>10}")
+    for result in sorted(results, key=lambda r: -r['r2']):
+        row_us = result.get('flat_tree_row_us', result['single_row_us'])
+        print(f"{result['model']:<28}{result['r2']:>8.4f}{result['mse']:>16.0f}{result['fit_seconds']:>8.2f}"
+              f"{row_us:>10.1f}{result['batch_us_per_row']:>10.2f}{result['size_bytes'] / 1024:>10.0f}")
+    print("Row µs is the flat tree for decision trees (the serving path) and sklearn predict otherwise")
+    
+    if report_path:
+        with open(report_path, 'w') as f:
+            json.dump({'folds': folds, 'rows': len(y), 'results': results}, f, indent=2)
+        print(f"Model comparison saved to: {report_path}")
+    
+    return results
+
+def train_shard(X, y):
+    """Train and flatten the tree for one shard, returning it with its holdout predictions"""
+    # Very small shards are trained on every row and not scored
+    if len(y) < 10:
+        model = DecisionTreeRegressor(random_state=42, max_depth=10).fit(X, y)
+        return FlatTreeRegressor.from_sklearn(model), np.empty(0), np.empty(0)
+    
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+    model = DecisionTreeRegressor(random_state=42, max_depth=10).fit(X_train, y_train)
+    
+    tree = FlatTreeRegressor.from_sklearn(model)
+    if not np.array_equal(tree.predict(X), model.predict(X)):
+        raise ValueError('Flat shard tree predictions do not match the sklearn model')
+    return tree, y_test, tree.predict(X_test)
+
+def train_shards(X, y, shard_by, labels, only=None, models_dir='models'):
+    """Train one tree per area or crop in parallel and save them with a manifest"""
+    column = SHARD_COLUMNS[shard_by]
+    X = np.asarray(X, dtype=np.float32)
+    y = np.asarray(y)
+    codes = X[:, column].astype(np.int64)
+    
+    # Retraining selected shards keeps the other entries of an existing manifest
+    manifest = read_manifest(models_dir) if only else None
+    if manifest is None or manifest['shard_by'] != shard_by:
+        manifest = {'shard_by': shard_by, 'shards': {}}
+    selected = [code for code, label in enumerate(labels) if not only or label in only]
+    print(f"Training {len(selected)} {shard_by} shards in parallel...")
+    
+    results = Parallel(n_jobs=-1)(
+        delayed(train_shard)(X[codes == code], y[codes == code]) for code in selected
+    )
+    
+    # A full retrain replaces every shard, including ones for keys that no longer exist
+    shards_dir = os.path.join(models_dir, SHARDS_DIR)
+    if not manifest['shards'] and os.path.exists(shards_dir):
+        shutil.rmtree(shards_dir)
+    os.makedirs(shards_dir, exist_ok=True)
+    y_tests, y_preds = [], []
+    for code, (tree, y_test, y_pred) in zip(selected, results):
+        label = labels[code]
+        tree.save(os.path.join(shards_dir, shard_file(label)))
+        manifest['shards'][label] = {
+            'file': shard_file(label),
+            'rows': int(np.count_nonzero(codes == code)),
+            'nodes': tree.node_count,
+            'trained_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        }
+        y_tests.append(y_test)
+        y_preds.append(y_pred)
+    
+    # Write the manifest last; it is what the server watches and routes by
+    with open(os.path.join(shards_dir, SHARD_MANIFEST_FILE), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    
+    # Shards under 10 rows have no holdout, so a retrain of only those has nothing to score
+    y_test, y_pred = np.concatenate(y_tests), np.concatenate(y_preds)
+    print(f"Sharded model performance ({len(selected)} of {len(manifest['shards'])} shards trained):")
+    if len(y_test):
+        print(f"Mean Squared Error: {mean_squared_error(y_test, y_pred):.2f}")
+        print(f"R² Score: {r2_score(y_test, y_pred):.4f}")
+    else:
+        print("No holdout rows; every trained shard has fewer than 10 rows")
+    
+    return manifest
+
+def export_tree(model, X_check, path='models/crop_yield_tree.npz'):
+    """Export the trained tree as flat node arrays for the lightweight predictor"""
+    print("Exporting flat tree for inference...")
+    
+    tree = FlatTreeRegressor.from_sklearn(model)
+    
+    # The flat tree must reproduce sklearn's predictions exactly
+    expected = model.predict(X_check)
+    features = np.asarray(X_check)
+    if not np.array_equal(tree.predict(features), expected):
+        raise ValueError('Flat tree predictions do not match the sklearn model')
+    if any(tree.predict_one(row) != value for row, value in zip(features[:1000], expected)):
+        raise ValueError('Flat tree single-row predictions do not match the sklearn model')
+    
+    tree.save(path)
+    print(f"Flat tree with {tree.node_count} nodes matches sklearn on {len(features)} rows")
+    
+    return tree
+
 def main():
     """Main function to train the model"""
+    parser = argparse.ArgumentParser(description='Train the crop yield prediction model')
+    parser.add_argument('--rebuild-features', action='store_true',
+                        help='rebuild the training table from the raw yield, rainfall, pesticides and temperature CSVs')
+    parser.add_argument('--stream', action='store_true',
+                        help='ingest the training table in chunks into an on-disk store and train from it')
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='rows read per chunk with --stream')
+    parser.add_argument('--select-model', action='store_true',
+                        help='compare cross-validated candidate models instead of training the served one')
+    parser.add_argument('--folds', type=int, default=5, help='cross-validation folds with --select-model')
+    parser.add_argument('--report', help='JSON file for the --select-model results')
+    parser.add_argument('--shard-by', choices=sorted(SHARD_COLUMNS),
+                        help='also train one tree per area or crop, served by shard_router.py')
+    parser.add_argument('--shards', help='comma-separated areas or crops to retrain, keeping the other shards')
+    args = parser.parse_args()
+    if args.shards and not args.shard_by:
+        parser.error('--shards needs --shard-by')
+    
     print("🌾 Crop Yield Prediction Model Training")
     print("=" * 50)
     
     # Create models directory if it doesn't exist
-    import os
     os.makedirs('models', exist_ok=True)
     
-    # Load and preprocess data
-    X, y, unique_areas, unique_items = load_and_preprocess_data()
+    # Use the pre-joined data/yield_df.csv unless rebuilding it from the raw datasets
+    source_path = build_features() if args.rebuild_features else SOURCE_PATH
+    
+    # Load and preprocess data, streaming it through the columnar store for large tables
+    if args.stream:
+        ingest_csv(source_path, STORE_DIR, args.chunk_size)
+        X, y, unique_areas, unique_items, encoders = load_store_data(STORE_DIR)
+    else:
+        X, y, unique_areas, unique_items, encoders = load_and_preprocess_data(source_path)
+    
+    # Selection only reports; nothing in models/ is written, so the served artifacts stay consistent
+    if args.select_model:
+        select_model(X, y, args.folds, args.report)
+        return
+    
+    # Check the shards to retrain before anything is trained or written
+    only = None
+    if args.shard_by and args.shards:
+        labels = unique_areas if args.shard_by == 'area' else unique_items
+        only = {label.strip().lower() for label in args.shards.split(',') if label.strip()}
+        unknown = sorted(only - set(labels))
+        if not only or unknown:
+            parser.error(f"unknown {args.shard_by} shards: {', '.join(unknown) or args.shards!r}")
+    
+    # Retraining selected shards leaves the global tree and encoders alone; the new shards
+    # must encode areas and crops the same way as the tree they are served next to
+    if only:
+        if not encoders_match_saved(*encoders):
+            parser.error('--shards needs a trained model in models/ with the same areas and crops; '
+                         'train without --shards first')
+        train_shards(X, y, args.shard_by, labels, only)
+        print(f"Peak memory: {peak_memory_mb():.1f} MB")
+        print(f"\n✅ Retrained {len(only)} {args.shard_by} shard(s); the global model was left as it is")
+        return
     
     # Train the model
     model, X_test, y_test, y_pred = train_model(X, y)
     
+    # Export the flat tree used for serving
+    export_tree(model, X)
+    
+    # Save the encoders only with the tree they were trained with
+    save_encoders(*encoders, unique_areas, unique_items)
+    
+    # Per-area or per-crop trees; the global tree above serves keys without a shard
+    if args.shard_by:
+        labels = unique_areas if args.shard_by == 'area' else unique_items
+        train_shards(X, y, args.shard_by, labels, only)
+    elif os.path.exists(os.path.join('models', SHARDS_DIR)):
+        # Shards from an earlier run would otherwise keep overriding the new global tree
+        shutil.rmtree(os.path.join('models', SHARDS_DIR))
+        print("Removed shards from an earlier sharded training run")
+    print(f"Peak memory: {peak_memory_mb():.1f} MB")
+    
     print("\n✅ Model training completed successfully!")
     print(f"📊 Available crop types: {len(unique_items)}")
     print(f"🌍 Available countries: {len(unique_areas)}")
     print("\nModel saved to: models/crop_yield_model.pkl")
+    print("Flat tree saved to: models/crop_yield_tree.npz")
     print("Encoders saved to: models/area_encoder.pkl, models/item_encoder.pkl")
 
 if __name__ == "__main__":
@@ -0,0 +1,86 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# Cache sizing, overridable from the environment
+PREDICTION_CACHE_SIZE = int(os.environ.get('PREDICTION_CACHE_SIZE', 4096))
+PREDICTION_CACHE_TTL = float(os.environ.get('PREDICTION_CACHE_TTL', 0)) or None
+
+class PredictionCache:
+    """Bounded, thread-safe LRU cache for predictions with an optional TTL"""
+    
+    def __init__(self, maxsize=PREDICTION_CACHE_SIZE, ttl=PREDICTION_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.version = None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+    
+    def get(self, key):
+        """Return the cached value for key, or None on a miss"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            
+            value, expires = entry
+            if expires is not None and expires < time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+    
+    def put(self, key, value, version=None):
+        """Store a value computed against the given model version"""
+        if self.maxsize <= 0:
+            return
+        
+        expires = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            # Drop results computed by a model that has since been replaced
+            if version is not None and version != self.version:
+                return
+            
+            self._entries[key] = (value, expires)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+    
+    def validate(self, version):
+        """Clear the cache if the model version it was filled from has changed"""
+        if version == self.version:
+            return
+        with self._lock:
+            if version != self.version:
+                if self._entries:
+                    self.invalidations += 1
+                self._entries.clear()
+                self.version = version
+    
+    def stats(self):
+        """Return hit/miss/eviction counters for /api/stats"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations
+            }
@@ -0,0 +1,203 @@
+import argparse
+import itertools
+import json
+import os
+import shutil
+import tempfile
+import threading
+import numpy as np
+
+# Grid files live in this subdirectory of the models directory. Its files are not hashed into
+# the artifact version, so building a grid does not change the model version it is tied to
+GRID_DIR = 'grid'
+
+# Default grid: the form defaults in templates/index.html for every year in range
+GRID_YEARS = (1990, 2030)
+GRID_RAINFALL = (1000.0,)
+GRID_PESTICIDES = (100.0,)
+GRID_TEMPERATURE = (20.0,)
+
+# Arrays stored in the grid directory
+GRID_ARRAYS = ('predictions', 'history_offsets', 'history_climate', 'history_predictions')
+
+class PredictionGrid:
+    """Memory-mapped table of precomputed predictions for every (area, item, year)"""
+    
+    def __init__(self, arrays, meta):
+        # predictions[area, item, year, point] for the configured scenario points
+        self.predictions = arrays['predictions']
+        
+        # Historical climate rows of each (area, year) are history_climate[start:stop], with
+        # start and stop read from history_offsets; history_predictions[row, item] holds their results
+        self.history_offsets = arrays['history_offsets']
+        self.history_climate = arrays['history_climate']
+        self.history_predictions = arrays['history_predictions']
+        
+        self.model_version = meta['model_version']
+        self.first_year, self.last_year = meta['years']
+        self.n_years = self.last_year - self.first_year + 1
+        self.points = {tuple(point): index for index, point in enumerate(meta['points'])}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+    
+    @classmethod
+    def load(cls, models_dir, model_version):
+        """Open the grid in models_dir, or return None if it is missing or from another model"""
+        path = os.path.join(models_dir, GRID_DIR)
+        if not os.path.exists(os.path.join(path, 'meta.json')):
+            return None
+        with open(os.path.join(path, 'meta.json'), 'r') as f:
+            meta = json.load(f)
+        if meta['model_version'] != model_version:
+            print("⚠️ Prediction grid was built for another model version; ignoring it")
+            return None
+        
+        try:
+            arrays = {name: np.load(os.path.join(path, f'{name}.npy'), mmap_mode='r') for name in GRID_ARRAYS}
+        except (OSError, ValueError) as e:
+            # A missing or damaged grid only costs speed; serve from the model instead
+            print(f"⚠️ Could not load prediction grid: {e}")
+            return None
+        return cls(arrays, meta)
+    
+    def lookup(self, area_code, item_code, year, rainfall, pesticides, temperature):
+        """Return the precomputed prediction for an exact grid hit, or None"""
+        prediction = self.find(area_code, item_code, year, rainfall, pesticides, temperature)
+        
+        # Lookups run on Flask's request threads and the ASGI executor
+        with self._lock:
+            if prediction is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return prediction
+    
+    def find(self, area_code, item_code, year, rainfall, pesticides, temperature):
+        """The precomputed prediction for these inputs, or None, without counting the lookup"""
+        if not self.first_year <= year <= self.last_year:
+            return None
+        year_index = year - self.first_year
+        
+        point = self.points.get((rainfall, pesticides, temperature))
+        if point is not None:
+            return float(self.predictions[area_code, item_code, year_index, point])
+        
+        cell = area_code * self.n_years + year_index
+        for row in range(self.history_offsets[cell], self.history_offsets[cell + 1]):
+            climate = self.history_climate[row]
+            if climate[0] == rainfall and climate[1] == pesticides and climate[2] == temperature:
+                return float(self.history_predictions[row, item_code])
+        return None
+    
+    def stats(self):
+        """Return grid size and hit counters for /api/stats"""
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        lookups = hits + misses
+        return {
+            'years': [self.first_year, self.last_year],
+            'points': len(self.points),
+            'historical_points': len(self.history_climate),
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': round(hits / lookups, 4) if lookups else 0.0
+        }
+
+def historical_climate(area_codes, first_year, last_year):
+    """Distinct (rainfall, pesticides, temperature) rows in yield_df.csv per area and year"""
+    from data_snapshot import load_snapshot
+    
+    columns, meta = load_snapshot()
+    n_years = last_year - first_year + 1
+    labels = meta['categories']['area']
+    
+    climates = [set() for _ in range(len(area_codes) * n_years)]
+    for code, year, rainfall, pesticides, temperature in zip(
+            columns['area'], columns['year'], columns['rainfall'], columns['pesticides'], columns['temperature']):
+        area = area_codes.get(labels[code])
+        if area is not None and first_year <= year <= last_year:
+            climates[area * n_years + year - first_year].add((float(rainfall), float(pesticides), float(temperature)))
+    
+    offsets = np.zeros(len(climates) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(cell) for cell in climates])
+    rows = [climate for cell in climates for climate in sorted(cell)]
+    return offsets, np.array(rows, dtype=np.float64).reshape(-1, 3)
+
+def build_grid(models_dir='models', years=GRID_YEARS, rainfall=GRID_RAINFALL,
+               pesticides=GRID_PESTICIDES, temperature=GRID_TEMPERATURE):
+    """Predict every (area, item, year) over the scenario grid and historical climate"""
+    from model_loader import load_bundle
+    
+    bundle = load_bundle(models_dir)
+    first_year, last_year = years
+    year_values = np.arange(first_year, last_year + 1)
+    points = [list(point) for point in itertools.product(rainfall, pesticides, temperature)]
+    n_areas, n_items = len(bundle.area_codes), len(bundle.item_codes)
+    print(f"Building prediction grid: {n_areas} areas x {n_items} crops x {len(year_values)} years "
+          f"x {len(points)} scenarios plus historical climate...")
+    
+    # Scenario points: one feature row per (area, item, year, point), predicted in one call
+    area_index, item_index, year_index, point_index = np.meshgrid(
+        np.arange(n_areas), np.arange(n_items), np.arange(len(year_values)), np.arange(len(points)),
+        indexing='ij')
+    features = np.column_stack([
+        area_index.ravel(), item_index.ravel(), year_values[year_index.ravel()],
+        np.array(points, dtype=np.float64)[point_index.ravel()]
+    ])
+    predictions = bundle.predict(features).reshape(area_index.shape)
+    
+    # Historical climate rows, each predicted for every item
+    history_offsets, history_climate = historical_climate(bundle.area_codes, first_year, last_year)
+    cells = np.repeat(np.arange(len(history_offsets) - 1), np.diff(history_offsets))
+    history_features = np.column_stack([
+        np.repeat(cells // len(year_values), n_items),
+        np.tile(np.arange(n_items), len(cells)),
+        np.repeat(year_values[cells % len(year_values)], n_items),
+        np.repeat(history_climate, n_items, axis=0)
+    ])
+    history_predictions = bundle.predict(history_features).reshape(len(cells), n_items)
+    
+    arrays = {
+        'predictions': predictions,
+        'history_offsets': history_offsets,
+        'history_climate': history_climate,
+        'history_predictions': history_predictions
+    }
+    meta = {
+        'model_version': bundle.version,
+        'years': [first_year, last_year],
+        'points': points
+    }
+    
+    # Write into a temporary directory and swap it into place once complete
+    path = os.path.join(models_dir, GRID_DIR)
+    tmp_path = tempfile.mkdtemp(dir=models_dir, prefix='.grid-')
+    for name, values in arrays.items():
+        np.save(os.path.join(tmp_path, f'{name}.npy'), values)
+    with open(os.path.join(tmp_path, 'meta.json'), 'w') as f:
+        json.dump(meta, f)
+    if os.path.exists(path):
+        shutil.rmtree(path)
+    os.rename(tmp_path, path)
+    
+    print(f"Grid with {predictions.size + history_predictions.size} predictions saved to {path} "
+          f"(model version {bundle.version})")
+    return meta
+
+def parse_values(text):
+    """Parse a comma-separated list of numbers"""
+    return tuple(float(value) for value in text.split(','))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Precompute predictions for common inputs')
+    parser.add_argument('--years', default=f'{GRID_YEARS[0]}-{GRID_YEARS[1]}', help='year range, e.g. 1990-2030')
+    parser.add_argument('--rainfall', type=parse_values, default=GRID_RAINFALL, help='comma-separated rainfall values (mm)')
+    parser.add_argument('--pesticides', type=parse_values, default=GRID_PESTICIDES, help='comma-separated pesticide values (tonnes)')
+    parser.add_argument('--temperature', type=parse_values, default=GRID_TEMPERATURE, help='comma-separated temperatures (°C)')
+    args = parser.parse_args()
+    
+    first_year, last_year = (int(year) for year in args.years.split('-'))
+    build_grid(years=(first_year, last_year), rainfall=args.rainfall,
+               pesticides=args.pesticides, temperature=args.temperature)
+    print("✅ Prediction grid ready; reload or restart app.py to use it")
@@ -0,0 +1,144 @@
+import hmac
+import os
+import random
+import sys
+import threading
+import time
+from datetime import datetime
+from flask import jsonify, request, send_from_directory
+
+# Where collapsed-stack profiles are written, and how many are kept
+PROFILE_DIR = os.environ.get('PROFILE_DIR', 'profiles')
+PROFILE_MAX_FILES = int(os.environ.get('PROFILE_MAX_FILES', 200))
+
+# Fraction of profiled-endpoint requests to sample without being asked (0 disables)
+PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', 0))
+
+# Seconds between stack samples. The sampler also needs the GIL, so while the request thread
+# runs Python code samples come at most once per interpreter switch interval (5 ms by default)
+PROFILE_INTERVAL = float(os.environ.get('PROFILE_INTERVAL', 0.0001))
+
+def frame_name(frame):
+    """file:function label for one stack frame"""
+    return f'{os.path.basename(frame.f_code.co_filename)}:{frame.f_code.co_name}'
+
+class StackSampler:
+    """Samples the Python stack of one thread from a background thread"""
+    
+    def __init__(self, thread_id, interval=PROFILE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.counts = {}
+        self.samples = 0
+        self.started = None
+        self.duration = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+    
+    def start(self):
+        self.started = time.perf_counter()
+        self._thread.start()
+        return self
+    
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.duration = time.perf_counter() - self.started
+    
+    def _run(self):
+        while not self._stop.is_set():
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                stack = []
+                while frame is not None:
+                    stack.append(frame_name(frame))
+                    frame = frame.f_back
+                key = ';'.join(reversed(stack))
+                self.counts[key] = self.counts.get(key, 0) + 1
+                self.samples += 1
+            self._stop.wait(self.interval)
+    
+    def collapsed(self):
+        """Stacks in the collapsed format read by flamegraph.pl and speedscope"""
+        return ''.join(f'{stack} {count}\n' for stack, count in sorted(self.counts.items()))
+
+def save_profile(sampler, label, profile_dir=PROFILE_DIR):
+    """Write a sampler's stacks to profile_dir and return the file name"""
+    os.makedirs(profile_dir, exist_ok=True)
+    name = f"{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}-{label}.folded"
+    with open(os.path.join(profile_dir, name), 'w') as f:
+        f.write(sampler.collapsed())
+    
+    # Keep only the newest PROFILE_MAX_FILES profiles
+    profiles = sorted(entry for entry in os.listdir(profile_dir) if entry.endswith('.folded'))
+    for old in profiles[:-PROFILE_MAX_FILES]:
+        try:
+            os.remove(os.path.join(profile_dir, old))
+        except OSError:
+            pass
+    return name
+
+def is_admin_request():
+    """Admin endpoints need the ADMIN_TOKEN header when one is configured, otherwise a local client"""
+    token = os.environ.get('ADMIN_TOKEN')
+    if token:
+        return hmac.compare_digest(request.headers.get('X-Admin-Token', ''), token)
+    return request.remote_addr in ('127.0.0.1', '::1')
+
+def should_profile(is_admin):
+    """Profile when an admin asks with X-Profile / ?profile=1, or for a sampled share of traffic"""
+    if request.headers.get('X-Profile') == '1' or request.args.get('profile') == '1':
+        if is_admin():
+            return True
+    return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+def register_profiling(app, is_admin, paths=('/api/predict',), profile_dir=PROFILE_DIR):
+    """Add opt-in request profiling for paths and admin endpoints to list and download profiles"""
+    
+    @app.before_request
+    def start_profile():
+        if request.path in paths and should_profile(is_admin):
+            request.environ['crop_yield.profiler'] = StackSampler(threading.get_ident()).start()
+    
+    @app.after_request
+    def finish_profile(response):
+        sampler = request.environ.pop('crop_yield.profiler', None)
+        if sampler is not None:
+            sampler.stop()
+            label = request.path.strip('/').replace('/', '-')
+            response.headers['X-Profile-Id'] = save_profile(sampler, label, profile_dir)
+            response.headers['X-Profile-Samples'] = str(sampler.samples)
+        return response
+    
+    @app.teardown_request
+    def stop_profile(error=None):
+        # after_request does not run when a view raises; never leave a sampler running
+        sampler = request.environ.pop('crop_yield.profiler', None)
+        if sampler is not None:
+            sampler.stop()
+    
+    @app.route('/api/admin/profiles', methods=['GET'])
+    def list_profiles():
+        """List saved request profiles, newest first"""
+        if not is_admin():
+            return jsonify({'error': 'Forbidden'}), 403
+        if not os.path.isdir(profile_dir):
+            return jsonify({'profiles': []})
+        
+        profiles = []
+        for name in sorted(os.listdir(profile_dir), reverse=True):
+            if name.endswith('.folded'):
+                stat = os.stat(os.path.join(profile_dir, name))
+                profiles.append({
+                    'name': name,
+                    'size': stat.st_size,
+                    'created': datetime.fromtimestamp(stat.st_mtime).strftime('%Y-%m-%d %H:%M:%S')
+                })
+        return jsonify({'profiles': profiles})
+    
+    @app.route('/api/admin/profiles/<name>', methods=['GET'])
+    def download_profile(name):
+        """Download one profile in collapsed-stack format"""
+        if not is_admin():
+            return jsonify({'error': 'Forbidden'}), 403
+        return send_from_directory(os.path.abspath(profile_dir), name, mimetype='text/plain', as_attachment=True)
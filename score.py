@@ -0,0 +1,198 @@
+import argparse
+import collections
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from model_loader import load_bundle, MODELS_DIR
+
+CHUNK_SIZE = 50000
+
+# Input columns with the same defaults as the /api/predict form
+INPUT_DEFAULTS = {
+    'area': '',
+    'item': '',
+    'year': 2024,
+    'rainfall': 1000.0,
+    'pesticides': 100.0,
+    'temperature': 20.0
+}
+
+# yield_df.csv headers accepted in place of the API field names
+COLUMN_ALIASES = {
+    'Area': 'area',
+    'Item': 'item',
+    'Year': 'year',
+    'average_rain_fall_mm_per_year': 'rainfall',
+    'pesticides_tonnes': 'pesticides',
+    'avg_temp': 'temperature'
+}
+
+# Bundle loaded once in each worker process
+_bundle = None
+
+def init_worker(models_dir):
+    """Load the model bundle in a pool worker"""
+    global _bundle
+    _bundle = load_bundle(models_dir)
+
+def prepare_chunk(chunk):
+    """Rename yield_df headers and fill missing inputs with the form defaults"""
+    chunk = chunk.rename(columns=COLUMN_ALIASES)
+    for column, default in INPUT_DEFAULTS.items():
+        if column not in chunk:
+            chunk[column] = default
+        else:
+            chunk[column] = chunk[column].fillna(default)
+    return chunk
+
+def parse_errors(raw, values, integer=False):
+    """Rows of an input column that int() or float() would reject, with app.parse_input's error"""
+    failed = (values != np.trunc(values)) if integer else values.isna()
+    kind = 'invalid literal for int() with base 10' if integer else 'could not convert string to float'
+    return failed, raw[failed].map(lambda value: f'Invalid input: {kind}: {str(value)!r}')
+
+def score_chunk(chunk, bundle=None):
+    """Validate, encode and predict one chunk, returning it with prediction, confidence and error columns"""
+    bundle = bundle or _bundle
+    chunk = prepare_chunk(chunk)
+    
+    areas = chunk['area'].astype(str).str.lower()
+    items = chunk['item'].astype(str).str.lower()
+    area_codes = areas.map(bundle.area_codes)
+    item_codes = items.map(bundle.item_codes)
+    year = pd.to_numeric(chunk['year'], errors='coerce')
+    rainfall = pd.to_numeric(chunk['rainfall'], errors='coerce')
+    pesticides = pd.to_numeric(chunk['pesticides'], errors='coerce')
+    temperature = pd.to_numeric(chunk['temperature'], errors='coerce')
+    
+    # Same checks as app.parse_input and app.validate_input; the first failing check is reported per row
+    checks = [
+        parse_errors(chunk['year'], year, integer=True),
+        parse_errors(chunk['rainfall'], rainfall),
+        parse_errors(chunk['pesticides'], pesticides),
+        parse_errors(chunk['temperature'], temperature),
+        (area_codes.isna(), 'Area not found'),
+        (item_codes.isna(), 'Crop not found'),
+        (~year.between(1990, 2030), 'Year must be between 1990 and 2030'),
+        (~rainfall.between(0, 5000), 'Rainfall must be between 0 and 5000 mm'),
+        (~pesticides.between(0, 10000), 'Pesticides must be between 0 and 10000 tonnes'),
+        (~temperature.between(-50, 50), 'Temperature must be between -50 and 50°C')
+    ]
+    error = pd.Series(None, index=chunk.index, dtype=object)
+    for failed, message in reversed(checks):
+        error[failed] = message
+    valid = error.isna().to_numpy()
+    
+    predictions = np.full(len(chunk), np.nan)
+    if valid.any():
+        features = np.column_stack([
+            area_codes[valid], item_codes[valid], year[valid].astype(int),
+            rainfall[valid], pesticides[valid], temperature[valid]
+        ]).astype(np.float64)
+        predictions[valid] = bundle.predict(features)
+    
+    # Whole years are written back as integers; years that did not parse are left empty
+    chunk['year'] = year.where(year == np.trunc(year)).astype('Int64')
+    chunk['prediction'] = np.round(predictions, 2)
+    # app.confidence_score for every row at once
+    chunk['confidence'] = np.round(np.clip(100 - np.abs(predictions - 50000) / 1000, 60, 95), 1)
+    chunk['error'] = error
+    return chunk
+
+def read_chunks(path, chunk_size=CHUNK_SIZE):
+    """Yield DataFrame chunks of a CSV or Parquet file without reading it whole"""
+    if path.endswith('.parquet'):
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, chunksize=chunk_size)
+
+class ResultWriter:
+    """Appends scored chunks to a CSV or Parquet file"""
+    
+    def __init__(self, path):
+        self.path = path
+        self.parquet = path.endswith('.parquet')
+        self._writer = None
+        self._first = True
+    
+    def write(self, chunk):
+        if self.parquet:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if self._writer is None:
+                self._writer = pq.ParquetWriter(self.path, table.schema)
+            self._writer.write_table(table.cast(self._writer.schema))
+        else:
+            chunk.to_csv(self.path, mode='w' if self._first else 'a', header=self._first, index=False)
+        self._first = False
+    
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+
+def score_file(input_path, output_path, models_dir=MODELS_DIR, workers=None, chunk_size=CHUNK_SIZE):
+    """Score every row of input_path into output_path, spreading chunks over a process pool"""
+    workers = workers or os.cpu_count() or 1
+    print(f"🚀 Scoring {input_path} -> {output_path} with {workers} worker(s), {chunk_size} rows per chunk")
+    started = time.perf_counter()
+    rows = 0
+    failed = 0
+    writer = ResultWriter(output_path)
+    
+    def report(chunk):
+        nonlocal rows, failed
+        writer.write(chunk)
+        rows += len(chunk)
+        failed += int(chunk['error'].notna().sum())
+        elapsed = time.perf_counter() - started
+        print(f"  {rows:,} rows scored ({rows / elapsed:,.0f} rows/s)")
+    
+    try:
+        if workers == 1:
+            bundle = load_bundle(models_dir)
+            for chunk in read_chunks(input_path, chunk_size):
+                report(score_chunk(chunk, bundle))
+        else:
+            with ProcessPoolExecutor(workers, initializer=init_worker, initargs=(models_dir,)) as pool:
+                # Keep a bounded number of chunks in flight so the input is never read whole,
+                # and write results in input order
+                pending = collections.deque()
+                for chunk in read_chunks(input_path, chunk_size):
+                    pending.append(pool.submit(score_chunk, chunk))
+                    if len(pending) >= workers * 2:
+                        report(pending.popleft().result())
+                while pending:
+                    report(pending.popleft().result())
+    finally:
+        writer.close()
+    
+    elapsed = time.perf_counter() - started
+    print(f"✅ Scored {rows:,} rows in {elapsed:.1f}s ({rows / max(elapsed, 1e-9):,.0f} rows/s), {failed:,} invalid")
+    return rows, failed
+
+def main():
+    """Score a CSV or Parquet file of inputs with the trained model"""
+    parser = argparse.ArgumentParser(description='Offline bulk scoring with the trained crop yield model')
+    parser.add_argument('input', help='CSV or .parquet file with area, item, year, rainfall, pesticides and temperature columns')
+    parser.add_argument('output', help='CSV or .parquet file to write; inputs plus prediction, confidence and error')
+    parser.add_argument('--models-dir', default=MODELS_DIR, help=f'trained artifacts (default {MODELS_DIR})')
+    parser.add_argument('--workers', type=int, default=None, help='worker processes (default: all cores)')
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help=f'rows per chunk (default {CHUNK_SIZE})')
+    args = parser.parse_args()
+    
+    # Parquet needs pyarrow, which is optional and not in requirements.txt
+    if args.input.endswith('.parquet') or args.output.endswith('.parquet'):
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            parser.error('Parquet files need pyarrow (pip install pyarrow)')
+    
+    score_file(args.input, args.output, args.models_dir, args.workers, args.chunk_size)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,200 @@
+import argparse
+import gc
+import importlib
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler
+
+# Seconds workers get to finish in-flight requests after SIGTERM before they are killed
+GRACEFUL_TIMEOUT = int(os.environ.get('GRACEFUL_TIMEOUT', 30))
+
+class QuietRequestHandler(WSGIRequestHandler):
+    """Request handler without per-request access log lines"""
+    
+    def log_request(self, code='-', size='-'):
+        pass
+
+class PooledWSGIServer(BaseWSGIServer):
+    """WSGI server that handles connections on a fixed-size thread pool"""
+    
+    # Lets werkzeug enable HTTP/1.1 keep-alive, as for its threaded server
+    multithread = True
+    
+    def __init__(self, host, port, app, threads, fd, handler=None):
+        super().__init__(host, port, app, handler=handler, fd=fd)
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='request')
+    
+    def process_request(self, request, client_address):
+        self.executor.submit(self.process_request_thread, request, client_address)
+    
+    def process_request_thread(self, request, client_address):
+        """Same as socketserver.ThreadingMixIn, but run on the pool"""
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+def preload(name):
+    """Import the app module and load everything it serves from before forking"""
+    module = importlib.import_module(name)
+    if name == 'app':
+        if module.model_holder.warm_up() is None:
+            sys.exit("❌ Model not loaded. Please run model_training.py first.")
+    elif name == 'simple_app':
+        module.load_data()
+    return module
+
+def memory_usage(pid):
+    """Resident, proportional, shared and private memory of a process in MB, from smaps_rollup"""
+    fields = {}
+    with open(f'/proc/{pid}/smaps_rollup', 'r') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == 'kB':
+                fields[parts[0].rstrip(':')] = int(parts[1]) / 1024
+    return {
+        'rss': fields.get('Rss', 0.0),
+        'pss': fields.get('Pss', 0.0),
+        'shared': fields.get('Shared_Clean', 0.0) + fields.get('Shared_Dirty', 0.0),
+        'private': fields.get('Private_Clean', 0.0) + fields.get('Private_Dirty', 0.0)
+    }
+
+def print_memory_report(workers):
+    """Print memory per process; PSS splits shared pages between the processes using them"""
+    print(f"{'Process':<16}{'RSS MB':>10}{'PSS MB':>10}{'Shared MB':>12}{'Private MB':>12}")
+    for label, pid in [('master', os.getpid())] + [(f'worker {pid}', pid) for pid in workers]:
+        try:
+            usage = memory_usage(pid)
+        except OSError:
+            continue
+        print(f"{label:<16}{usage['rss']:>10.1f}{usage['pss']:>10.1f}{usage['shared']:>12.1f}{usage['private']:>12.1f}")
+    sys.stdout.flush()
+
+def run_worker(app_name, sock, threads, access_log, preloaded):
+    """Serve requests on the inherited listening socket until SIGTERM"""
+    if not preloaded:
+        module = preload(app_name)
+    else:
+        module = importlib.import_module(app_name)
+        if app_name == 'app':
+            # Threads do not survive fork; restart the model watcher in this worker
+            module.model_holder.after_fork()
+    
+    handler = None if access_log else QuietRequestHandler
+    host, port = sock.getsockname()[:2]
+    server = PooledWSGIServer(host, port, module.app, threads, sock.fileno(), handler)
+    
+    # shutdown() waits for serve_forever() to return, so it cannot run in the signal handler's thread
+    signal.signal(signal.SIGTERM, lambda signum, frame: threading.Thread(target=server.shutdown).start())
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGUSR1, signal.SIG_IGN)
+    
+    server.serve_forever()
+    
+    # Stop accepting connections and let the pool finish the requests it already has
+    server.server_close()
+    server.executor.shutdown(wait=True)
+
+def spawn_worker(app_name, sock, threads, access_log, preloaded):
+    """Fork a worker process and return its pid"""
+    pid = os.fork()
+    if pid:
+        return pid
+    
+    code = 0
+    try:
+        run_worker(app_name, sock, threads, access_log, preloaded)
+    except BaseException:
+        traceback.print_exc()
+        code = 1
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os._exit(code)
+
+def main():
+    """Preload the app in this process, then fork workers that share its memory"""
+    parser = argparse.ArgumentParser(description='Run app.py or simple_app.py with preforked workers')
+    parser.add_argument('--app', choices=['app', 'simple_app'], default='app', help='which server to run')
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='worker processes')
+    parser.add_argument('--threads', type=int, default=8, help='request threads per worker')
+    parser.add_argument('--no-preload', action='store_true',
+                        help='load the app in each worker instead of the master (for memory comparisons)')
+    parser.add_argument('--access-log', action='store_true', help='log every request')
+    parser.add_argument('--memory-report', action='store_true', help='print memory per process once workers are up')
+    args = parser.parse_args()
+    
+    if not args.no_preload:
+        print(f"🔄 Preloading {args.app}...")
+        preload(args.app)
+        
+        # Move everything loaded so far out of the garbage collector's reach, so collections
+        # in the workers do not write to (and un-share) these pages
+        gc.freeze()
+    
+    sock = socket.create_server((args.host, args.port), backlog=1024)
+    sock.set_inheritable(True)
+    
+    stopping = False
+    workers = {}
+    
+    def start_worker():
+        pid = spawn_worker(args.app, sock, args.threads, args.access_log, not args.no_preload)
+        workers[pid] = time.monotonic()
+    
+    def stop(signum, frame):
+        nonlocal stopping
+        if stopping:
+            return
+        stopping = True
+        print(f"🛑 Shutting down {len(workers)} workers...")
+        for pid in list(workers):
+            os.kill(pid, signal.SIGTERM)
+        signal.alarm(GRACEFUL_TIMEOUT)
+    
+    def kill(signum, frame):
+        for pid in list(workers):
+            os.kill(pid, signal.SIGKILL)
+    
+    for _ in range(args.workers):
+        start_worker()
+    
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGALRM, kill)
+    signal.signal(signal.SIGUSR1, lambda signum, frame: print_memory_report(workers))
+    
+    print(f"🚀 Serving {args.app} on http://{args.host}:{args.port} with "
+          f"{args.workers} workers x {args.threads} threads (pid {os.getpid()})")
+    if args.memory_report:
+        time.sleep(1)
+        print_memory_report(workers)
+    
+    while workers:
+        pid, status = os.wait()
+        started = workers.pop(pid, None)
+        if started is None or stopping:
+            continue
+        
+        # Replace workers that died, unless they keep dying straight after starting
+        print(f"❌ Worker {pid} exited with status {os.waitstatus_to_exitcode(status)}")
+        if time.monotonic() - started < 1:
+            print("❌ Worker failed on startup; not restarting it")
+        else:
+            start_worker()
+    
+    sock.close()
+    print("✅ All workers stopped")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+import numpy as np
+from tree_inference import FlatTreeRegressor
+
+# Sharded artifacts live in this subdirectory of the models directory
+SHARDS_DIR = 'shards'
+SHARD_MANIFEST_FILE = 'manifest.json'
+
+# Feature column each shard key selects on
+SHARD_COLUMNS = {'area': 0, 'item': 1}
+
+# Largest number of shards kept loaded at once, overridable from the environment
+SHARD_CACHE_SIZE = int(os.environ.get('SHARD_CACHE_SIZE', 32))
+
+def shard_file(label):
+    """File name for the shard of one area or crop"""
+    return re.sub(r'[^a-z0-9]+', '_', label.lower()).strip('_') + '.npz'
+
+def read_manifest(models_dir):
+    """Read the shard manifest from models_dir, or None if the model is not sharded"""
+    path = os.path.join(models_dir, SHARDS_DIR, SHARD_MANIFEST_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r') as f:
+        return json.load(f)
+
+class ShardRouter:
+    """Routes each feature row to the tree trained for its area or crop, loading shards lazily"""
+    
+    def __init__(self, shards_dir, manifest, key_codes, fallback=None, maxsize=SHARD_CACHE_SIZE):
+        self.shards_dir = shards_dir
+        self.shard_by = manifest['shard_by']
+        self.column = SHARD_COLUMNS[self.shard_by]
+        self.fallback = fallback
+        self.maxsize = maxsize
+        
+        # Shard files keyed on the encoded area or item, as it appears in the feature row
+        self.files = {
+            key_codes[label]: entry['file']
+            for label, entry in manifest['shards'].items() if label in key_codes
+        }
+        
+        self._loaded = OrderedDict()
+        self._lock = threading.Lock()
+        self.loads = 0
+        self.evictions = 0
+    
+    def shard(self, code):
+        """Return the tree for an encoded key, or the fallback model when it has no shard"""
+        file = self.files.get(code)
+        if file is None:
+            return self.fallback
+        
+        with self._lock:
+            tree = self._loaded.get(code)
+            if tree is not None:
+                self._loaded.move_to_end(code)
+                return tree
+        
+        # Load outside the lock so a slow read does not block requests for other shards
+        tree = FlatTreeRegressor.load(os.path.join(self.shards_dir, file))
+        with self._lock:
+            self._loaded[code] = tree
+            self.loads += 1
+            while len(self._loaded) > self.maxsize:
+                self._loaded.popitem(last=False)
+                self.evictions += 1
+        return tree
+    
+    def predict(self, X):
+        """Predict a 2-D feature array, one vectorized call per shard present in it"""
+        X = np.asarray(X, dtype=np.float32)
+        predictions = np.empty(len(X), dtype=np.float64)
+        codes = X[:, self.column].astype(np.int64)
+        for code in np.unique(codes):
+            rows = codes == code
+            model = self.shard(int(code))
+            if model is None:
+                raise ValueError(f'No shard or fallback model for {self.shard_by} code {code}')
+            predictions[rows] = model.predict(X[rows])
+        return predictions
+    
+    def predict_one(self, features):
+        """Predict a single feature row with its shard"""
+        model = self.shard(int(features[self.column]))
+        if model is None:
+            raise ValueError(f'No shard or fallback model for {self.shard_by} code {features[self.column]}')
+        return model.predict_one(features)
+    
+    def stats(self):
+        """Return shard counts and cache counters for /api/stats"""
+        with self._lock:
+            return {
+                'shard_by': self.shard_by,
+                'shards': len(self.files),
+                'resident': len(self._loaded),
+                'maxsize': self.maxsize,
+                'loads': self.loads,
+                'evictions': self.evictions
+            }
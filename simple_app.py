@@ -1,126 +1,273 @@
-import csv
+import hashlib
 import json
 import random
+from datetime import datetime
+import numpy as np
 from flask import Flask, request, jsonify, render_template_string
 from flask_cors import CORS
 import os
+from compression import PrecomputedJSON
+from json_provider import FastJSONProvider
+from prediction_cache import PredictionCache
+from data_snapshot import load_snapshot, COLUMN_DTYPES, MISSING_YEAR
+from profiler import is_admin_request, register_profiling
+from streaming import ndjson_response, wants_stream
+from sweep import parse_sweep, range_extremes, sweep_columns, sweep_payload, sweep_records
 
 app = Flask(__name__)
+app.json = FastJSONProvider(app)
 CORS(app)
 
+# Cache of similarity-weighted yields keyed on the normalized inputs
+prediction_cache = PredictionCache()
+
+# Prediction jitter: 'random' (default), 'hash' (derived from the inputs) or 'off'
+PREDICTION_JITTER = os.environ.get('PREDICTION_JITTER', 'random')
+
 # Global variables to store data
-yield_data = []
+yield_data = {}
 unique_areas = []
 unique_items = []
 
+# Largest (points x candidate rows) similarity matrix computed at once by a sweep
+SWEEP_BLOCK_CELLS = 1000000
+
+# Numeric columns held in yield_data next to the encoded 'area' and 'item' columns
+NUMERIC_COLUMNS = ('year', 'rainfall', 'pesticides', 'temperature', 'yield')
+
+# Values used for blank fields in the source CSV
+MISSING_DEFAULTS = {'year': 2020, 'rainfall': 1000, 'pesticides': 100, 'temperature': 20, 'yield': 0}
+
+# Category encodings and lookup indexes built once by build_store()
+area_codes = {}   # area -> int code
+item_codes = {}   # item -> int code
+pair_index = {}   # (area code, item code) -> (start, stop) row slice sorted by year
+area_index = {}   # area code -> (start, stop) row slice
+item_index = {}   # item code -> array of row positions
+data_version = None
+data_modified_at = None
+
+# /api/areas and /api/crops bodies, encoded and compressed once per data load
+list_responses = {'areas': PrecomputedJSON({'areas': []}), 'crops': PrecomputedJSON({'crops': []})}
+
 def load_data():
     """Load and process the yield data"""
-    global yield_data, unique_areas, unique_items
-    
     try:
-        with open('data/yield_df.csv', 'r', encoding='utf-8') as file:
-            reader = csv.DictReader(file)
-            for row in reader:
-                # Clean and process the data
-                if row.get('Area') and row.get('Item') and row.get('hg/ha_yield'):
-                    try:
-                        processed_row = {
-                            'area': row['Area'].lower().strip(),
-                            'item': row['Item'].lower().strip(),
-                            'year': int(row['Year']) if row['Year'].isdigit() else 2020,
-                            'rainfall': float(row['average_rain_fall_mm_per_year']) if row['average_rain_fall_mm_per_year'] else 1000,
-                            'pesticides': float(row['pesticides_tonnes']) if row['pesticides_tonnes'] else 100,
-                            'temperature': float(row['avg_temp']) if row['avg_temp'] else 20,
-                            'yield': float(row['hg/ha_yield']) if row['hg/ha_yield'] else 0
-                        }
-                        yield_data.append(processed_row)
-                    except (ValueError, KeyError):
-                        continue
-        
-        # Extract unique areas and items
-        unique_areas = sorted(list(set(row['area'] for row in yield_data)))
-        unique_items = sorted(list(set(row['item'] for row in yield_data)))
+        # Memory-map the columnar snapshot of data/yield_df.csv (rebuilt when the CSV changes)
+        columns, meta = load_snapshot()
+        data = fill_missing({name: columns[name] for name in ('area', 'item') + NUMERIC_COLUMNS})
+        categories = meta['categories']
+        try:
+            modified_at = os.path.getmtime(meta['source'])
+        except OSError:
+            modified_at = None
+        build_store(data, categories['area'], categories['item'], meta['source_sha256'], modified_at)
         
-        print(f"✅ Loaded {len(yield_data)} data points")
+        print(f"✅ Loaded {len(yield_data['yield'])} data points")
         print(f"🌍 Available countries: {len(unique_areas)}")
         print(f"🌾 Available crops: {len(unique_items)}")
         
     except Exception as e:
         print(f"❌ Error loading data: {e}")
         # Create sample data if file not found
-        create_sample_data()
+        build_store(*create_sample_data(), 'sample')
+
+def fill_missing(data):
+    """Replace missing snapshot values with the defaults used for blank CSV fields"""
+    for name, default in MISSING_DEFAULTS.items():
+        values = data[name]
+        missing = values == MISSING_YEAR if name == 'year' else np.isnan(values)
+        # Only copy a column when it actually has gaps, so clean columns stay memory-mapped
+        if missing.any():
+            data[name] = np.where(missing, default, values).astype(values.dtype)
+    return data
+
+def build_store(data, areas, items, version, modified_at=None):
+    """Index NumPy columns sorted by (area, item, year) for similarity lookups"""
+    global yield_data, unique_areas, unique_items, area_codes, item_codes
+    global pair_index, area_index, item_index, data_version, data_modified_at, list_responses
+    
+    # Areas and items are encoded as small ints indexing these lists
+    unique_areas = list(areas)
+    unique_items = list(items)
+    area_codes = {area: code for code, area in enumerate(unique_areas)}
+    item_codes = {item: code for code, item in enumerate(unique_items)}
+    
+    # Every (area, item) group must be a contiguous, year-ordered slice; snapshots already are
+    order = np.lexsort((data['year'], data['item'], data['area']))
+    if not np.array_equal(order, np.arange(len(order))):
+        data = {name: values[order] for name, values in data.items()}
+    yield_data = data
+    
+    pair_keys = data['area'].astype(np.int32) * len(unique_items) + data['item']
+    pair_index = {
+        (int(data['area'][start]), int(data['item'][start])): (start, stop)
+        for start, stop in _runs(pair_keys)
+    }
+    area_index = {int(data['area'][start]): (start, stop) for start, stop in _runs(data['area'])}
+    item_index = {code: np.flatnonzero(data['item'] == code) for code in range(len(unique_items))}
+    
+    # Cached yields are only valid for the data they were computed from
+    data_version = version
+    data_modified_at = modified_at
+    prediction_cache.validate(version)
+    
+    # The lists only change with the data, so their responses are built here once
+    list_responses = {
+        'areas': PrecomputedJSON({'areas': unique_areas}, modified_at),
+        'crops': PrecomputedJSON({'crops': unique_items}, modified_at)
+    }
+
+def _runs(keys):
+    """Yield (start, stop) bounds of runs of equal values in a sorted array"""
+    if len(keys) == 0:
+        return
+    starts = np.flatnonzero(np.concatenate(([True], keys[1:] != keys[:-1])))
+    stops = np.append(starts[1:], len(keys))
+    for start, stop in zip(starts.tolist(), stops.tolist()):
+        yield start, stop
 
 def create_sample_data():
     """Create sample data for demonstration"""
-    global yield_data, unique_areas, unique_items
+    sample_areas = sorted(['india', 'usa', 'china', 'brazil', 'russia', 'france', 'germany', 'uk', 'japan', 'australia'])
+    sample_items = sorted(['wheat', 'rice', 'maize', 'potatoes', 'soybeans', 'cotton', 'sugarcane', 'barley', 'oats', 'sorghum'])
     
-    sample_areas = ['india', 'usa', 'china', 'brazil', 'russia', 'france', 'germany', 'uk', 'japan', 'australia']
-    sample_items = ['wheat', 'rice', 'maize', 'potatoes', 'soybeans', 'cotton', 'sugarcane', 'barley', 'oats', 'sorghum']
+    columns = {name: [] for name in ('area', 'item') + NUMERIC_COLUMNS}
     
-    for area in sample_areas:
-        for item in sample_items:
+    for area_code in range(len(sample_areas)):
+        for item_code in range(len(sample_items)):
             for year in range(2010, 2024):
-                yield_data.append({
-                    'area': area,
-                    'item': item,
-                    'year': year,
-                    'rainfall': random.uniform(500, 2000),
-                    'pesticides': random.uniform(50, 500),
-                    'temperature': random.uniform(15, 30),
-                    'yield': random.uniform(10000, 100000)
-                })
-    
-    unique_areas = sample_areas
-    unique_items = sample_items
-
-def predict_yield_simple(area, item, year, rainfall, pesticides, temperature):
+                columns['area'].append(area_code)
+                columns['item'].append(item_code)
+                columns['year'].append(year)
+                columns['rainfall'].append(random.uniform(500, 2000))
+                columns['pesticides'].append(random.uniform(50, 500))
+                columns['temperature'].append(random.uniform(15, 30))
+                columns['yield'].append(random.uniform(10000, 100000))
+    
+    data = {name: np.array(values, dtype=COLUMN_DTYPES[name]) for name, values in columns.items()}
+    return data, sample_areas, sample_items
+
+def predict_yield_simple(area, item, year, rainfall, pesticides, temperature, seed=None):
     """Simple prediction algorithm based on similar data points"""
-    # Find similar data points
-    similar_data = []
+    key = (area.lower(), item.lower(), year, rainfall, pesticides, temperature)
+    predicted_yield = prediction_cache.get(key)
+    if predicted_yield is None:
+        predicted_yield = similarity_weighted_yield(area, item, year, rainfall, pesticides, temperature)
+        prediction_cache.put(key, predicted_yield, data_version)
+    
+    # Add some randomness for realistic predictions
+    predicted_yield *= jitter_factor(key, seed)
     
-    for row in yield_data:
-        if (row['area'] == area.lower() and 
-            row['item'] == item.lower() and
-            abs(row['year'] - year) <= 5):
-            similar_data.append(row)
+    return max(0, predicted_yield)
+
+def is_deterministic(seed=None):
+    """Whether predictions for the same inputs (and seed) always give the same result"""
+    return seed is not None or PREDICTION_JITTER != 'random'
+
+def jitter_factor(key, seed=None):
+    """Random factor in [0.8, 1.2), derived from the inputs and seed in deterministic mode"""
+    if not is_deterministic(seed):
+        return random.uniform(0.8, 1.2)
     
-    if not similar_data:
-        # If no exact matches, find similar crops and areas
-        for row in yield_data:
-            if (row['area'] == area.lower() or 
-                row['item'] == item.lower()):
-                similar_data.append(row)
+    if seed is None and PREDICTION_JITTER == 'off':
+        return 1.0
     
-    if not similar_data:
-        # Use all data as fallback
-        similar_data = yield_data
-    
-    # Calculate weighted average based on similarity
-    total_weight = 0
-    weighted_yield = 0
-    
-    for row in similar_data:
-        # Calculate similarity score
-        year_diff = abs(row['year'] - year) / 10
-        rainfall_diff = abs(row['rainfall'] - rainfall) / 2000
-        temp_diff = abs(row['temperature'] - temperature) / 30
-        pesticide_diff = abs(row['pesticides'] - pesticides) / 1000
-        
-        similarity = 1 / (1 + year_diff + rainfall_diff + temp_diff + pesticide_diff)
-        
-        weighted_yield += row['yield'] * similarity
-        total_weight += similarity
+    # Seeds from JSON bodies and query strings hash the same way
+    seed = None if seed is None else str(seed)
+    digest = hashlib.sha256(repr((seed, key)).encode('utf-8')).digest()
+    return 0.8 + 0.4 * int.from_bytes(digest[:8], 'big') / 2 ** 64
+
+def similarity_weighted_yield(area, item, year, rainfall, pesticides, temperature):
+    """Weighted average yield of the data points most similar to the inputs"""
+    similar_rows = find_similar_rows(area_codes.get(area.lower()), item_codes.get(item.lower()), year)
+    
+    # Calculate weighted average based on similarity, vectorized over the candidate rows
+    year_diff = np.abs(yield_data['year'][similar_rows] - year) / 10
+    rainfall_diff = np.abs(yield_data['rainfall'][similar_rows] - rainfall) / 2000
+    temp_diff = np.abs(yield_data['temperature'][similar_rows] - temperature) / 30
+    pesticide_diff = np.abs(yield_data['pesticides'][similar_rows] - pesticides) / 1000
+    
+    similarity = 1 / (1 + year_diff + rainfall_diff + temp_diff + pesticide_diff)
+    
+    total_weight = similarity.sum()
+    weighted_yield = (yield_data['yield'][similar_rows] * similarity).sum()
     
     if total_weight > 0:
-        predicted_yield = weighted_yield / total_weight
+        predicted_yield = float(weighted_yield / total_weight)
     else:
         # Fallback prediction
         predicted_yield = 50000
     
-    # Add some randomness for realistic predictions
-    predicted_yield *= random.uniform(0.8, 1.2)
+    return predicted_yield
+
+def find_similar_rows(area_code, item_code, year):
+    """Rows (a slice or an index array) of the data points used to predict for these inputs"""
+    # Find similar data points: same area and item within five years
+    similar_rows = None
     
-    return max(0, predicted_yield)
+    if (area_code, item_code) in pair_index:
+        start, stop = pair_index[(area_code, item_code)]
+        years = yield_data['year'][start:stop]
+        low = start + int(np.searchsorted(years, year - 5, side='left'))
+        high = start + int(np.searchsorted(years, year + 5, side='right'))
+        if high > low:
+            similar_rows = slice(low, high)
+    
+    if similar_rows is None:
+        # If no exact matches, find similar crops and areas
+        parts = []
+        if area_code in area_index:
+            parts.append(np.arange(*area_index[area_code]))
+        if item_code in item_index:
+            rows = item_index[item_code]
+            parts.append(rows[yield_data['area'][rows] != area_code])
+        if parts:
+            candidates = np.concatenate(parts)
+            if len(candidates):
+                similar_rows = candidates
+    
+    if similar_rows is None:
+        # Use all data as fallback
+        similar_rows = slice(None)
+    
+    return similar_rows
+
+def similarity_weighted_yields(area, item, years, rainfalls, pesticides, temperatures):
+    """similarity_weighted_yield for many input points of one area and item at once"""
+    area_code = area_codes.get(area.lower())
+    item_code = item_codes.get(item.lower())
+    years = np.asarray(years)
+    predictions = np.empty(len(years))
+    
+    # The candidate rows depend only on the year, so each distinct year is one matrix of
+    # (points x candidate rows) similarities, split into blocks to bound its size
+    for year in np.unique(years):
+        points = np.flatnonzero(years == year)
+        similar_rows = find_similar_rows(area_code, item_code, int(year))
+        data_year = yield_data['year'][similar_rows]
+        data_rainfall = yield_data['rainfall'][similar_rows]
+        data_temperature = yield_data['temperature'][similar_rows]
+        data_pesticides = yield_data['pesticides'][similar_rows]
+        data_yield = yield_data['yield'][similar_rows]
+        year_diff = np.abs(data_year - int(year)) / 10
+        
+        block = max(1, SWEEP_BLOCK_CELLS // len(data_yield))
+        for start in range(0, len(points), block):
+            rows = points[start:start + block]
+            rainfall_diff = np.abs(data_rainfall - rainfalls[rows, None]) / 2000
+            temp_diff = np.abs(data_temperature - temperatures[rows, None]) / 30
+            pesticide_diff = np.abs(data_pesticides - pesticides[rows, None]) / 1000
+            
+            similarity = 1 / (1 + year_diff + rainfall_diff + temp_diff + pesticide_diff)
+            
+            total_weight = similarity.sum(axis=1)
+            weighted_yield = (data_yield * similarity).sum(axis=1)
+            # Fallback prediction where no candidate row has any weight
+            weighted = total_weight > 0
+            predictions[rows] = np.where(weighted, weighted_yield / np.where(weighted, total_weight, 1), 50000)
+    
+    return predictions
 
 def generate_insights(area, item, year, rainfall, pesticides, temperature, prediction):
     """Generate insights based on the prediction"""
@@ -160,16 +307,42 @@ def generate_insights(area, item, year, rainfall, pesticides, temperature, predi
     
     return insights
 
+# Opt-in sampling profiles of /api/predict, listed and downloaded through the admin endpoints
+register_profiling(app, is_admin_request)
+
+def validate_input(area, item, year, rainfall, pesticides, temperature):
+    """Return an error message for invalid parameters, or None if they are valid"""
+    if area not in area_codes:
+        return f'Area "{area}" not found. Available areas: {unique_areas[:10]}...'
+    
+    if item not in item_codes:
+        return f'Crop "{item}" not found. Available crops: {unique_items[:10]}...'
+    
+    if year < 1990 or year > 2030:
+        return 'Year must be between 1990 and 2030'
+    
+    if rainfall < 0 or rainfall > 5000:
+        return 'Rainfall must be between 0 and 5000 mm'
+    
+    if pesticides < 0 or pesticides > 10000:
+        return 'Pesticides must be between 0 and 10000 tonnes'
+    
+    if temperature < -50 or temperature > 50:
+        return 'Temperature must be between -50 and 50°C'
+    
+    return None
+
 @app.route('/')
 def index():
     """Serve the main application page"""
     return render_template_string(HTML_TEMPLATE)
 
-@app.route('/api/predict', methods=['POST'])
+@app.route('/api/predict', methods=['GET', 'POST'])
 def predict_yield():
     """Predict crop yield based on input parameters"""
     try:
-        data = request.get_json()
+        # GET takes the parameters from the query string so deterministic responses can be cached
+        data = request.args.to_dict() if request.method == 'GET' else request.get_json()
         
         # Extract input parameters
         area = data.get('area', '').lower()
@@ -178,28 +351,15 @@ def predict_yield():
         rainfall = float(data.get('rainfall', 1000))
         pesticides = float(data.get('pesticides', 100))
         temperature = float(data.get('temperature', 20))
+        seed = data.get('seed')
         
         # Validate inputs
-        if area not in unique_areas:
-            return jsonify({'error': f'Area "{area}" not found. Available areas: {unique_areas[:10]}...'}), 400
-        
-        if item not in unique_items:
-            return jsonify({'error': f'Crop "{item}" not found. Available crops: {unique_items[:10]}...'}), 400
-        
-        if year < 1990 or year > 2030:
-            return jsonify({'error': 'Year must be between 1990 and 2030'}), 400
-        
-        if rainfall < 0 or rainfall > 5000:
-            return jsonify({'error': 'Rainfall must be between 0 and 5000 mm'}), 400
-        
-        if pesticides < 0 or pesticides > 10000:
-            return jsonify({'error': 'Pesticides must be between 0 and 10000 tonnes'}), 400
-        
-        if temperature < -50 or temperature > 50:
-            return jsonify({'error': 'Temperature must be between -50 and 50°C'}), 400
+        error = validate_input(area, item, year, rainfall, pesticides, temperature)
+        if error:
+            return jsonify({'error': error}), 400
         
         # Make prediction
-        prediction = predict_yield_simple(area, item, year, rainfall, pesticides, temperature)
+        prediction = predict_yield_simple(area, item, year, rainfall, pesticides, temperature, seed)
         
         # Calculate confidence score
         confidence = min(95, max(60, 100 - abs(prediction - 50000) / 1000))
@@ -207,7 +367,7 @@ def predict_yield():
         # Generate insights
         insights = generate_insights(area, item, year, rainfall, pesticides, temperature, prediction)
         
-        return jsonify({
+        response = jsonify({
             'prediction': round(prediction, 2),
             'confidence': round(confidence, 1),
             'insights': insights,
@@ -221,28 +381,90 @@ def predict_yield():
             }
         })
         
+        # Reproducible responses get an ETag; GET requests can then be answered with 304
+        if is_deterministic(seed):
+            response.add_etag()
+            response.make_conditional(request)
+        else:
+            response.headers['Cache-Control'] = 'no-store'
+        
+        return response
+        
     except Exception as e:
         return jsonify({'error': f'Prediction failed: {str(e)}'}), 500
 
+@app.route('/api/predict/sweep', methods=['POST'])
+def predict_yield_sweep():
+    """Predict crop yield over one or two input ranges in a single vectorized pass"""
+    try:
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict):
+            raise ValueError('Expected a JSON object with "base" inputs and "ranges"')
+        
+        # Base inputs default like /api/predict; the swept fields replace theirs
+        base = data.get('base', data)
+        base = {
+            'area': base.get('area', '').lower(),
+            'item': base.get('item', '').lower(),
+            'year': int(base.get('year', 2024)),
+            'rainfall': float(base.get('rainfall', 1000)),
+            'pesticides': float(base.get('pesticides', 100)),
+            'temperature': float(base.get('temperature', 20))
+        }
+        axes = parse_sweep(data)
+    except (ValueError, TypeError, AttributeError) as e:
+        return jsonify({'error': f'Invalid input: {str(e)}'}), 400
+    
+    # The limits are per field, so checking the ends of each range covers the whole grid
+    for values in range_extremes(base, axes):
+        error = validate_input(**values)
+        if error:
+            return jsonify({'error': error}), 400
+    
+    area, item = base['area'], base['item']
+    # The sweep returns the similarity-weighted yields without jitter, so the
+    # curve shows how the inputs move the prediction rather than random noise
+    def predict(columns):
+        predictions = similarity_weighted_yields(area, item, columns['year'].astype(int),
+                                                 columns['rainfall'], columns['pesticides'], columns['temperature'])
+        return np.maximum(predictions, 0)
+    
+    # Streamed sweeps are predicted and written in blocks of grid points
+    if wants_stream():
+        return ndjson_response(sweep_records(base, axes, predict))
+    
+    try:
+        return jsonify(sweep_payload(base, axes, predict(sweep_columns(base, axes))))
+        
+    except Exception as e:
+        return jsonify({'error': f'Sweep failed: {str(e)}'}), 500
+
 @app.route('/api/areas', methods=['GET'])
 def get_areas():
     """Get list of available areas"""
-    return jsonify({'areas': unique_areas})
+    return list_responses['areas'].response()
 
 @app.route('/api/crops', methods=['GET'])
 def get_crops():
     """Get list of available crops"""
-    return jsonify({'crops': unique_items})
+    return list_responses['crops'].response()
 
 @app.route('/api/stats', methods=['GET'])
 def get_stats():
     """Get basic statistics about the model"""
-    return jsonify({
+    response = jsonify({
         'total_areas': len(unique_areas),
         'total_crops': len(unique_items),
-        'total_data_points': len(yield_data),
-        'model_type': 'Similarity-based prediction'
+        'total_data_points': len(yield_data['yield']),
+        'model_type': 'Similarity-based prediction',
+        'prediction_cache': prediction_cache.stats(),
+        'last_updated': datetime.fromtimestamp(data_modified_at).strftime('%Y-%m-%d %H:%M:%S') if data_modified_at else None
     })
+    
+    # The cache counters change with every prediction, so the ETag is hashed per response
+    response.add_etag()
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
 
 # HTML Template
 HTML_TEMPLATE = '''
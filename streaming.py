@@ -0,0 +1,35 @@
+import itertools
+import os
+from flask import Response, request, stream_with_context
+from json_provider import dumps
+
+NDJSON_MIMETYPE = 'application/x-ndjson'
+
+# Rows predicted and written per block of a streamed response
+STREAM_BLOCK_SIZE = int(os.environ.get('STREAM_BLOCK_SIZE', 1000))
+
+def wants_stream():
+    """Whether the client asked for NDJSON with ?stream=1 or Accept: application/x-ndjson"""
+    return request.args.get('stream') == '1' or request.accept_mimetypes.best == NDJSON_MIMETYPE
+
+def iter_blocks(rows, size=STREAM_BLOCK_SIZE):
+    """Split any iterable into lists of at most size items"""
+    rows = iter(rows)
+    while True:
+        block = list(itertools.islice(rows, size))
+        if not block:
+            return
+        yield block
+
+def ndjson_response(blocks):
+    """Stream an iterable of record lists as NDJSON, with one write per block"""
+    def generate():
+        try:
+            for records in blocks:
+                yield b''.join(dumps(record) + b'\n' for record in records)
+        except Exception as e:
+            # The status line is already sent, so a failure ends the stream with an error record
+            yield dumps({'error': f'Streaming failed: {str(e)}'}) + b'\n'
+    
+    # Keeps the request available to generators that read the body as they go
+    return Response(stream_with_context(generate()), mimetype=NDJSON_MIMETYPE)
@@ -0,0 +1,116 @@
+import argparse
+import json
+import os
+import resource
+import shutil
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+
+SOURCE_PATH = 'data/yield_df.csv'
+STORE_DIR = 'data/cache/store'
+CHUNK_SIZE = 100000
+
+# Explicit dtypes for reading each chunk, so pandas never has to infer them
+CSV_DTYPES = {
+    'Area': 'category',
+    'Item': 'category',
+    'Year': 'float64',
+    'hg/ha_yield': 'float64',
+    'average_rain_fall_mm_per_year': 'float32',
+    'pesticides_tonnes': 'float32',
+    'avg_temp': 'float32'
+}
+
+# Store columns, their source CSV fields and on-disk dtypes. Features are float32,
+# which is what the decision tree trains on anyway
+STORE_COLUMNS = {
+    'area': ('Area', np.int32),
+    'item': ('Item', np.int32),
+    'year': ('Year', np.int16),
+    'rainfall': ('average_rain_fall_mm_per_year', np.float32),
+    'pesticides': ('pesticides_tonnes', np.float32),
+    'temperature': ('avg_temp', np.float32),
+    'yield': ('hg/ha_yield', np.float64)
+}
+
+def peak_memory_mb():
+    """Peak resident memory of this process so far, in MB"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def encode_chunk(values, codes):
+    """Encode a categorical chunk column, giving labels not seen before the next free codes"""
+    labels = [str(label).lower().strip() for label in values.cat.categories]
+    chunk_codes = np.array([codes.setdefault(label, len(codes)) for label in labels], dtype=np.int32)
+    return chunk_codes[values.cat.codes.to_numpy()]
+
+def ingest_csv(source_path=SOURCE_PATH, store_dir=STORE_DIR, chunk_size=CHUNK_SIZE):
+    """Stream a yield CSV in chunks into an on-disk columnar store without loading it whole"""
+    print(f"Streaming {source_path} into {store_dir} in chunks of {chunk_size} rows...")
+    started = time.perf_counter()
+    
+    categories = {'area': {}, 'item': {}}
+    rows = 0
+    chunks = 0
+    
+    # Write into a temporary directory and swap it into place once complete
+    parent = os.path.dirname(os.path.abspath(store_dir))
+    os.makedirs(parent, exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(dir=parent, prefix='.store-')
+    files = {name: open(os.path.join(tmp_dir, f'{name}.bin'), 'wb') for name in STORE_COLUMNS}
+    try:
+        reader = pd.read_csv(source_path, usecols=list(CSV_DTYPES), dtype=CSV_DTYPES, chunksize=chunk_size)
+        for chunk in reader:
+            # Same cleaning as model_training: drop incomplete rows
+            chunk = chunk.dropna()
+            for name, (field, dtype) in STORE_COLUMNS.items():
+                if name in categories:
+                    values = encode_chunk(chunk[field], categories[name])
+                else:
+                    values = chunk[field].to_numpy(dtype=dtype)
+                files[name].write(np.ascontiguousarray(values, dtype=dtype).tobytes())
+            rows += len(chunk)
+            chunks += 1
+    finally:
+        for file in files.values():
+            file.close()
+    
+    meta = {
+        'source': source_path,
+        'rows': rows,
+        'chunks': chunks,
+        'columns': {name: np.dtype(dtype).name for name, (field, dtype) in STORE_COLUMNS.items()},
+        # Category labels in code order (first-seen order, not sorted)
+        'categories': {name: list(codes) for name, codes in categories.items()}
+    }
+    with open(os.path.join(tmp_dir, 'meta.json'), 'w') as f:
+        json.dump(meta, f)
+    
+    if os.path.exists(store_dir):
+        shutil.rmtree(store_dir)
+    os.rename(tmp_dir, store_dir)
+    
+    elapsed = time.perf_counter() - started
+    print(f"Ingested {rows} rows in {chunks} chunks ({elapsed:.2f}s)")
+    print(f"Peak memory after ingestion: {peak_memory_mb():.1f} MB")
+    return meta
+
+def open_store(store_dir=STORE_DIR):
+    """Memory-map the columns of a store written by ingest_csv()"""
+    with open(os.path.join(store_dir, 'meta.json'), 'r') as f:
+        meta = json.load(f)
+    
+    columns = {
+        name: np.memmap(os.path.join(store_dir, f'{name}.bin'), dtype=dtype, mode='r', shape=(meta['rows'],))
+        for name, dtype in meta['columns'].items()
+    }
+    return columns, meta
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Stream a yield CSV into an on-disk columnar store')
+    parser.add_argument('--source', default=SOURCE_PATH, help='CSV file with the yield_df.csv columns')
+    parser.add_argument('--store', default=STORE_DIR, help='output store directory')
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='rows read per chunk')
+    args = parser.parse_args()
+    ingest_csv(args.source, args.store, args.chunk_size)
@@ -0,0 +1,115 @@
+import os
+import numpy as np
+from streaming import STREAM_BLOCK_SIZE
+
+# Inputs that can be swept, and the largest grid evaluated in one request
+SWEEP_FIELDS = ('year', 'rainfall', 'pesticides', 'temperature')
+MAX_SWEEP_POINTS = int(os.environ.get('MAX_SWEEP_POINTS', 10000))
+
+# Points per range when only start and stop are given
+DEFAULT_STEPS = 21
+
+def parse_range(spec):
+    """Return (field, values) for one range given as explicit values or start/stop/steps"""
+    if not isinstance(spec, dict):
+        raise ValueError('Each range must be an object with a "field"')
+    
+    field = spec.get('field')
+    if field not in SWEEP_FIELDS:
+        raise ValueError(f'Range field must be one of {list(SWEEP_FIELDS)}')
+    
+    if 'values' in spec:
+        values = np.asarray(spec['values'], dtype=np.float64)
+        if values.ndim != 1:
+            raise ValueError(f'Range "{field}" values must be a list of numbers')
+    else:
+        if 'start' not in spec or 'stop' not in spec:
+            raise ValueError(f'Range "{field}" needs "values" or "start" and "stop"')
+        steps = int(spec.get('steps', DEFAULT_STEPS))
+        if steps < 1 or steps > MAX_SWEEP_POINTS:
+            raise ValueError(f'Range "{field}" steps must be between 1 and {MAX_SWEEP_POINTS}')
+        values = np.linspace(float(spec['start']), float(spec['stop']), steps)
+    
+    if len(values) == 0:
+        raise ValueError(f'Range "{field}" is empty')
+    if not np.isfinite(values).all():
+        raise ValueError(f'Range "{field}" values must be finite numbers')
+    
+    # Years are whole numbers, truncated like the year field of /api/predict
+    if field == 'year':
+        values = np.trunc(values)
+    return field, values
+
+def parse_sweep(data):
+    """Parse the one or two ranges of a sweep request into [(field, values), ...]"""
+    ranges = data.get('ranges')
+    if not isinstance(ranges, list) or not 1 <= len(ranges) <= 2:
+        raise ValueError('Expected "ranges" with one or two ranges to sweep')
+    
+    axes = [parse_range(spec) for spec in ranges]
+    if len(axes) == 2 and axes[0][0] == axes[1][0]:
+        raise ValueError('The two ranges must sweep different fields')
+    
+    points = int(np.prod([len(values) for _, values in axes]))
+    if points > MAX_SWEEP_POINTS:
+        raise ValueError(f'Sweep has {points} points; the limit is {MAX_SWEEP_POINTS}')
+    return axes
+
+def range_extremes(base, axes):
+    """Copies of the base inputs at the low and high end of each range, for validation"""
+    inputs = [base]
+    for field, values in axes:
+        for value in (values.min(), values.max()):
+            value = int(value) if field == 'year' else float(value)
+            inputs.append(dict(base, **{field: value}))
+    return inputs
+
+def sweep_columns(base, axes):
+    """Flattened columns of every numeric input over the grid, first range varying slowest"""
+    grids = np.meshgrid(*[values for _, values in axes], indexing='ij')
+    size = grids[0].size
+    columns = {field: np.full(size, base[field], dtype=np.float64) for field in SWEEP_FIELDS}
+    for (field, _), grid in zip(axes, grids):
+        columns[field] = grid.ravel()
+    return columns
+
+def sweep_header(base, axes):
+    """The axes, grid size and base inputs of a sweep"""
+    return {
+        'axes': [
+            {'field': field, 'values': values.astype(int).tolist() if field == 'year' else values.tolist()}
+            for field, values in axes
+        ],
+        'points': int(np.prod([len(values) for _, values in axes])),
+        'input_data': {
+            'area': base['area'].title(),
+            'item': base['item'].title(),
+            'year': base['year'],
+            'rainfall': base['rainfall'],
+            'pesticides': base['pesticides'],
+            'temperature': base['temperature']
+        }
+    }
+
+def sweep_payload(base, axes, predictions):
+    """Response body with the axes and the predictions shaped as a curve or surface"""
+    payload = sweep_header(base, axes)
+    shape = [len(values) for _, values in axes]
+    payload['predictions'] = np.round(np.asarray(predictions, dtype=np.float64), 2).reshape(shape).tolist()
+    return payload
+
+def sweep_records(base, axes, predict, block_size=STREAM_BLOCK_SIZE):
+    """Blocks of streamed sweep records: the header, then one record per grid point"""
+    yield [sweep_header(base, axes)]
+    
+    # predict takes a block of the sweep_columns() arrays and returns its predictions
+    columns = sweep_columns(base, axes)
+    fields = [field for field, _ in axes]
+    for start in range(0, len(columns['year']), block_size):
+        block = {field: values[start:start + block_size] for field, values in columns.items()}
+        predictions = np.round(np.asarray(predict(block), dtype=np.float64), 2).tolist()
+        values = [block[field].astype(int).tolist() if field == 'year' else block[field].tolist() for field in fields]
+        yield [
+            dict(zip(fields, point), prediction=prediction)
+            for point, prediction in zip(zip(*values), predictions)
+        ]
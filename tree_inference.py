@@ -0,0 +1,72 @@
+import numpy as np
+
+# Node arrays stored in an exported tree file
+TREE_ARRAYS = ('feature', 'threshold', 'children_left', 'children_right', 'value')
+
+class FlatTreeRegressor:
+    """Decision tree regressor evaluated from flat node arrays with plain NumPy"""
+    
+    def __init__(self, feature, threshold, children_left, children_right, value):
+        self.feature = np.asarray(feature, dtype=np.int16)
+        self.threshold = np.asarray(threshold, dtype=np.float64)
+        self.children_left = np.asarray(children_left, dtype=np.int32)
+        self.children_right = np.asarray(children_right, dtype=np.int32)
+        self.value = np.asarray(value, dtype=np.float64)
+        
+        # Python lists make single-row traversal cheaper than NumPy scalar indexing
+        self._feature = self.feature.tolist()
+        self._threshold = self.threshold.tolist()
+        self._left = self.children_left.tolist()
+        self._right = self.children_right.tolist()
+        self._value = self.value.tolist()
+    
+    @classmethod
+    def from_sklearn(cls, model):
+        """Flatten the tree_ of a fitted sklearn DecisionTreeRegressor"""
+        tree = model.tree_
+        return cls(tree.feature, tree.threshold, tree.children_left,
+                   tree.children_right, tree.value[:, 0, 0])
+    
+    @classmethod
+    def load(cls, path):
+        """Load a tree exported with save()"""
+        with np.load(path) as data:
+            return cls(**{name: data[name] for name in TREE_ARRAYS})
+    
+    def save(self, path):
+        """Save the node arrays to an .npz file"""
+        np.savez(path, **{name: getattr(self, name) for name in TREE_ARRAYS})
+    
+    @property
+    def node_count(self):
+        return len(self.value)
+    
+    def predict(self, X):
+        """Predict a 2-D feature array, walking all rows down the tree together"""
+        # sklearn compares float32 features against float64 thresholds; do the same for exact parity
+        X = np.asarray(X, dtype=np.float32)
+        rows = np.arange(len(X))
+        nodes = np.zeros(len(X), dtype=np.int32)
+        
+        active = rows
+        while len(active):
+            current = nodes[active]
+            left = self.children_left[current]
+            internal = left != -1
+            active, current, left = active[internal], current[internal], left[internal]
+            
+            go_left = X[active, self.feature[current]] <= self.threshold[current]
+            nodes[active] = np.where(go_left, left, self.children_right[current])
+        
+        return self.value[nodes]
+    
+    def predict_one(self, features):
+        """Predict a single feature row without any array overhead"""
+        row = np.asarray(features, dtype=np.float32).tolist()
+        feature, threshold, left, right = self._feature, self._threshold, self._left, self._right
+        
+        node = 0
+        while left[node] != -1:
+            node = left[node] if row[feature[node]] <= threshold[node] else right[node]
+        
+        return self._value[node]